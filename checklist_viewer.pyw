@@ -4,111 +4,124 @@ Checklist Viewer — 清单树独立版（列宽70px & 真·单实例）
 - 左列：文件类别
 - 右列：状态 | 数量  (✅[N] / ⬜[N])，初始宽度 70px，min 50px，可拖动
 - 窗口更紧凑：默认 300x540，可自行调整
-- F5 刷新、双击类别打开目录
+- F5 刷新、双击类别打开目录；勾选“监视”后目录变化自动更新
 - 单实例：Windows 命名互斥量 + 本地端口双保险；多次/快速双击只保留一个窗口
+- 本地端口（阻塞式 socketserver，空闲不占 CPU）：置顶，以及主程序搬完文件后推送的 add / refresh
 """
 
 import json
+import logging
 import os
-import socket
 import socketserver
 import sys
-from pathlib import Path
-from datetime import datetime
+import threading
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-# =============== 配置定位（与 Kinder Classify 相同顺序） ===============
-SCRIPT_DIR = Path(__file__).resolve().parent
-CANDIDATES = [
-    SCRIPT_DIR,
-    Path(r"E:/ShangJin_Kindergarten/KinderClassify"),
-    Path(r"E:\ShangJin_Kindergarten\KinderClassify"),
-]
-CONFIG = None
-for base in CANDIDATES:
-    c = base / "config.json"
-    if c.exists():
-        CONFIG = c
-        break
-if CONFIG is None:
-    CONFIG = SCRIPT_DIR / "config.json"  # 兜底
-
-# =============== 与 Kinder Classify 一致的工具函数 ===============
-def load_config() -> dict:
-    with open(CONFIG, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def now_ym():
-    n = datetime.now()
-    return n.year, n.month
-
-def fmt_ym(y: int, m: int):
-    return f"{y:04d}", f"{m:02d}", f"{y:04d}{m:02d}"
-
-def target_dir(cfg: dict, it: dict, y: int, m: int) -> Path:
-    YYYY, MM, YYYYMM = fmt_ym(y, m)
-    if it.get("path_template"):
-        return Path(it["path_template"].format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM))
-    if cfg.get("default_path_template"):
-        return Path(cfg["default_path_template"].format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM))
-    return Path(cfg["out_root"]) / f"{YYYYMM}_Unclassified"
-
-def expected_prefix(it: dict, y: int, m: int) -> str:
-    YYYY, MM, _ = fmt_ym(y, m)
-    tpl = it["rename"].replace("{YYYY}", YYYY).replace("{MM}", MM)
-    cut = len(tpl)
-    for token in ("{orig}", "{DD}", "{ext}"):
-        i = tpl.find(token)
-        if i != -1 and i < cut:
-            cut = i
-    return tpl[:cut]
-
-def compute_status_and_count(cfg: dict, y: int, m: int):
-    status, counts = {}, {}
-    for it in cfg["items"]:
-        d = target_dir(cfg, it, y, m)
-        prefix = expected_prefix(it, y, m)
-        exts = [e.lower() for e in it.get("exts", [])] if it.get("exts") else None
-        cnt = 0
-        if d.exists():
-            for p in d.iterdir():
-                if not p.is_file():      continue
-                if not p.name.startswith(prefix): continue
-                if exts and p.suffix.lower() not in exts: continue
-                cnt += 1
-        rule = it.get("present_rule", {"mode": "any"})
-        ok = (cnt >= int(rule.get("n", 1))) if rule.get("mode") == "count_at_least" else (cnt > 0)
-        status[it["key"]] = ok
-        counts[it["key"]] = cnt
-    return status, counts
-
-def group_of(k: str) -> str:
-    l, r = k.find("【"), k.find("】")
-    return k[l+1:r].strip() if (l != -1 and r != -1 and r > l) else "其他"
-
-def grouped_items(items: list):
-    groups, order = {}, []
-    for it in items:
-        g = group_of(it["key"])
-        if g not in groups:
-            groups[g] = []
-            order.append(g)
-        groups[g].append(it)
-    return order, groups
+# 配置定位、规则、目录索引 / 监视 / IPC 与主程序共用同一套（同目录下的 kinder_core.py）
+from kinder_core import (
+    CONFIG, LOG, setup_logging, load_config, now_ym, as_rules, ConfigWatcher, VIEWER_ADDR, ipc_request, write_msg,
+    msg_files,
+)
+# 清单树的同步、刷新、监视与热加载和主程序共用一份（kinder_checklist.py）
+from kinder_checklist import ChecklistMixin
 
 # =============== 单实例：互斥量 + 端口双保险 ===============
-IPC_HOST, IPC_PORT = "127.0.0.1", 53452  # 与 Kinder Classify 不同
+IPC_HOST, IPC_PORT = VIEWER_ADDR  # 与 Kinder Classify 不同
 MUTEX_NAME = r"Global\Checklist_Viewer_Singleton_v1"
+_SRV = None
+
+class _Handler(socketserver.StreamRequestHandler):
+    """一行一条 JSON；兼容旧版本发来的裸 b"RAISE"。"""
+    def handle(self):
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                return
+            if not line.strip():
+                return
+            if line.strip() == b"RAISE":
+                msg = {"cmd": "raise"}
+            else:
+                try:
+                    msg = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    write_msg(self.wfile, {"ok": False, "error": "bad message"})
+                    return
+            try:
+                write_msg(self.wfile, self.server.dispatch(msg))
+            except OSError:
+                return
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """阻塞式 accept（serve_forever 内部 selector 等待），空闲时不占 CPU。"""
+    allow_reuse_address = not sys.platform.startswith("win")
+    daemon_threads = True
+
+    def __init__(self, addr, handler):
+        super().__init__(addr, handler, bind_and_activate=True)
+        self.app_ref = None
+
+    def dispatch(self, msg) -> dict:
+        """出什么错都回一行 {"ok": false, "error": ...}，不让发送方干等。"""
+        if not isinstance(msg, dict):
+            return {"ok": False, "error": "bad message"}
+        try:
+            return self._dispatch(msg)
+        except (ValueError, TypeError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            logging.exception("IPC %s failed", msg.get("cmd"))
+            return {"ok": False, "error": str(e)}
+
+    def _dispatch(self, msg: dict) -> dict:
+        app, cmd = self.app_ref, msg.get("cmd")
+        if app is None:
+            return {"ok": False, "error": "starting"}
+        if cmd == "raise":
+            app.after(0, app.raise_to_front)
+        elif cmd == "add":
+            # 主程序刚搬进来的文件（最终路径）：按目录增量计数，不重列
+            changes = {}
+            for f in msg_files(msg):
+                d, name = os.path.split(f)
+                changes.setdefault(d, []).append(("add", name))
+            app.after(0, app._on_fs_change, changes)
+        elif cmd == "refresh":
+            # 指定目录只重列这些目录；不指定则整表刷新
+            dirs = msg_files(msg, "dirs")
+            if dirs:
+                app.after(0, app._on_fs_change, {d: None for d in dirs})
+            else:
+                app.after(0, app.refresh)
+        else:
+            return {"ok": False, "error": f"unknown cmd: {cmd}"}
+        return {"ok": True}
+
+def _start_server() -> bool:
+    global _SRV
+    try:
+        _SRV = _Server((IPC_HOST, IPC_PORT), _Handler)
+    except OSError:
+        return False
+    threading.Thread(target=_SRV.serve_forever, daemon=True).start()
+    return True
+
+def _raise_existing():
+    try:
+        ipc_request(IPC_HOST, IPC_PORT, {"cmd": "raise"})
+    except OSError:
+        pass
 
 def already_running_raise_then_exit() -> bool:
     """
     返回 True 表示检测到已有实例，且已请求其置顶；当前进程应立即退出。
     先用 Windows 互斥量判定；若已存在，再通过端口唤起已有窗口。
+    首个实例总会开本地端口，接收 置顶 / 主程序推送的 add、refresh。
     """
     try:
         import ctypes
-        from ctypes import wintypes
         kernel32 = ctypes.windll.kernel32
         # 创建命名互斥量（若已存在，GetLastError 将返回 ERROR_ALREADY_EXISTS=183）
         handle = kernel32.CreateMutexW(None, False, MUTEX_NAME)
@@ -117,51 +130,29 @@ def already_running_raise_then_exit() -> bool:
             raise OSError("CreateMutexW failed")
         err = kernel32.GetLastError()
         if err == 183:  # ERROR_ALREADY_EXISTS
-            try:
-                with socket.create_connection((IPC_HOST, IPC_PORT), timeout=0.8) as s:
-                    s.sendall(b"RAISE")
-            except OSError:
-                pass
+            _raise_existing()
             return True
         # 持有句柄到进程结束
         global _MUTEX_HANDLE
         _MUTEX_HANDLE = handle
+        _start_server()
         return False
     except Exception:
-        # 非 Windows 或 ctypes 失败，退化为端口方案
-        try:
-            srv = socket.socket()
-            srv.bind((IPC_HOST, IPC_PORT))
-            srv.listen(1)
-            srv.setblocking(False)
-            # 建立一个轻量线程用于收 RAISE，见 Viewer.__init__
-            global _SIMPLE_SRV
-            _SIMPLE_SRV = srv
+        # 非 Windows 或 ctypes 失败，退化为端口方案：端口被占用 → 已有实例
+        if _start_server():
             return False
-        except OSError:
-            # 端口被占用 → 已有实例
-            try:
-                with socket.create_connection((IPC_HOST, IPC_PORT), timeout=0.8) as s:
-                    s.sendall(b"RAISE")
-            except OSError:
-                pass
-            return True
+        _raise_existing()
+        return True
 
 # =============== UI ===============
-class Viewer(tk.Tk):
+class Viewer(ChecklistMixin, tk.Tk):
     def __init__(self, cfg: dict):
         super().__init__()
-        self.cfg = cfg
+        self.cfg = as_rules(cfg)
         self.title("Checklist Viewer")
         self.geometry("300x540")         # 更紧凑
         self.minsize(300, 340)
 
-        # 若仅使用端口方案，启动一个微型线程处理 RAISE
-        if "_SIMPLE_SRV" in globals():
-            import threading
-            t = threading.Thread(target=self._serve_raise_once, daemon=True)
-            t.start()
-
         y0, m0 = now_ym()
         self.year_var = tk.StringVar(value=str(y0))
         self.month_var = tk.StringVar(value=f"{m0:02d}")
@@ -169,6 +160,9 @@ class Viewer(tk.Tk):
         # 快捷键
         self.bind("<F5>", lambda e: self.refresh())
 
+        self._init_checklist()
+        self.watch_var = tk.BooleanVar(value=bool(cfg.get("watch", False)))
+
         # 顶部：年月 + 路径提示
         top = ttk.Frame(self, padding=(10, 8, 10, 0))
         top.pack(fill=tk.X)
@@ -212,26 +206,23 @@ class Viewer(tk.Tk):
         bottom = ttk.Frame(self, padding=(10, 0, 10, 10))
         bottom.pack(fill=tk.X)
         ttk.Button(bottom, text="刷新 (F5)", command=self.refresh).pack(side=tk.LEFT)
+        ttk.Checkbutton(bottom, text="监视", variable=self.watch_var,
+                        command=self._update_watch).pack(side=tk.LEFT, padx=(6, 0))
+        ttk.Button(bottom, text="全年", width=5, command=self.show_overview).pack(side=tk.LEFT, padx=(6, 0))
         self.status_var = tk.StringVar(value="就绪")
         ttk.Label(bottom, textvariable=self.status_var, anchor="w", relief="groove").pack(
             side=tk.LEFT, fill=tk.X, expand=True, padx=(10, 0)
         )
 
+        self._build_tree()
         self.refresh()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
-    # 端口方案的 RAISE 处理（仅当互斥量不可用时）
-    def _serve_raise_once(self):
-        srv = _SIMPLE_SRV
-        while True:
-            try:
-                conn, _ = srv.accept()
-            except BlockingIOError:
-                self.after(200, lambda: None)
-                continue
-            with conn:
-                _ = conn.recv(1024)
-                self.after(0, self.raise_to_front)
+        # config.json 改了不用重开：合法才按差异更新，不合法继续用旧规则
+        self.cfg_watcher = ConfigWatcher(self.cfg, lambda t: self.after(0, self._on_config_reload, t),
+                                         lambda e: self.after(0, self.set_status, f"配置有误，仍用旧规则：{e}"))
+        if _SRV:
+            _SRV.app_ref = self
 
     def raise_to_front(self):
         try:
@@ -250,60 +241,28 @@ class Viewer(tk.Tk):
         except Exception: return now_ym()
 
     def refresh(self):
-        y, m = self.current_ym()
-        YYYY, MM, YYYYMM = fmt_ym(y, m)
+        self._rescan()
+        self.set_status(f"刷新成功：{self._ok_summary()} 类满足")
 
-        if self.cfg.get("default_path_template"):
-            self.root_hint.set(self.cfg["default_path_template"].format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM))
-        else:
-            self.root_hint.set(f"{self.cfg.get('out_root', '')}/{YYYYMM}_Unclassified")
-
-        for iid in self.tree.get_children():
-            self.tree.delete(iid)
-
-        status, counts = compute_status_and_count(self.cfg, y, m)
-        order, groups = grouped_items(self.cfg["items"])
-        ok_ct, tot_ct = 0, 0
-        for g in order:
-            parent = self.tree.insert("", tk.END, text=f"—— {g} ——", tags=("group",), open=True)
-            for it in groups[g]:
-                key = it["key"]
-                mark = "✅" if status.get(key, False) else "⬜"
-                cnt = counts.get(key, 0)
-                self.tree.insert(parent, tk.END, text=key, values=(f"{mark}[{cnt}]",))
-                tot_ct += 1
-                if status.get(key, False): ok_ct += 1
-
-        self.set_status(f"刷新成功：{ok_ct}/{tot_ct} 类满足")
-
-    def open_dir_of_selected(self, event=None):
-        sel = self.tree.selection()
-        if not sel: return
-        iid = sel[0]
-        if self.tree.get_children(iid):  # 组标题
-            return
-        key = self.tree.item(iid, "text")
-        y, m = self.current_ym()
-        it = next((x for x in self.cfg["items"] if x["key"] == key), None)
-        if not it: return
-        d = target_dir(self.cfg, it, y, m)
-        try:
-            d.mkdir(parents=True, exist_ok=True)
-            os.startfile(str(d))
-        except Exception as e:
-            messagebox.showerror("打开失败", str(e))
+    def _on_config_reload(self, table):
+        self._reload_rules(table)
+        self.set_status(f"配置已更新：{self._ok_summary()} 类满足")
 
     def on_close(self):
-        # 互斥量句柄让系统回收即可；端口方案需主动关闭
+        # 互斥量句柄让系统回收即可；本地端口需主动关闭
         try:
-            if "_SIMPLE_SRV" in globals():
-                _SIMPLE_SRV.close()
+            if _SRV:
+                _SRV.shutdown()
+                _SRV.server_close()
         except Exception:
             pass
+        self._close_checklist()
+        self.cfg_watcher.stop()
         self.destroy()
 
 # =============== 入口 ===============
 def main():
+    setup_logging(LOG.with_name("checklist_viewer.log"))
     # 单实例：若已有 → 置顶后退出
     if already_running_raise_then_exit():
         return
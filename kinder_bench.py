@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Kinder Classify 基准测试（无界面，不需要显示器）
+用法：
+  python kinder_bench.py                        # 默认规模（10 ~ 100k 文件，10 ~ 500 类别）
+  python kinder_bench.py --quick                # 小规模，几秒跑完
+  python kinder_bench.py --files 1000,100000 --items 10,500 --dir Z:/tmp --out bench.json
+- 在临时目录（--dir 指定位置，可放到网络盘上测 SMB）生成合成 config 与目标目录树，跑完即删
+- scan：compute_status_and_count 全量刷新（每次新 DirIndex）、逐类别 count_for_item（不共用索引）、
+        年度总览冷/热（ScanCache）
+- classify：kinder_cli.run 批量分类（含 journal 写入），即界面 assign 的同一条搬移路径
+- conflict：move_with_conflict 把 N 个同名文件搬进已有 K 个同名文件的目录
+- suggest：按文件名建议（Matcher），含 glob / 关键字互相重叠的类别，wrong 为给错的个数
+- ipc：N 个并发“发送到”打本地 IPC 服务（kinder_classify._Server + _Handler），统计应答延迟与到达数
+- 输出：一个 JSON（env + results），两次运行可直接对比；不调用 setup_logging，不写正式日志，WARNING 以上只打到 stderr
+"""
+
+import os, sys, io, json, time, shutil, tempfile, platform, argparse, threading, logging
+from statistics import median
+from pathlib import Path
+
+from kinder_core import (
+    RuleTable, ScanCache, compute_status_and_count, count_for_item, iter_year_matrix,
+    move_with_conflict, ipc_request,
+)
+import kinder_cli
+
+Y, M = 2025, 10
+
+def timeit(fn, repeat: int) -> dict:
+    ts = []
+    for _ in range(repeat):
+        t = time.perf_counter(); fn(); ts.append((time.perf_counter() - t) * 1000)
+    return {"min_ms": round(min(ts), 3), "median_ms": round(median(ts), 3)}
+
+def pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return round(xs[min(len(xs) - 1, int(len(xs) * p))], 3) if xs else 0.0
+
+# ---------- 合成数据 ----------
+def make_config(root: Path, n_items: int) -> RuleTable:
+    """n_items 个类别，约每 5 个共用一个目标目录（与真实配置里一个资料夹放几类文件相近）。"""
+    n_dirs = max(1, n_items // 5)
+    items = [{"key": f"【G{i % 8}】item{i:03d}", "dest_subdir": f"D{i % n_dirs:03d}",
+              "rename": f"{i:03d}. {{YYYY}}{{MM}}_x{{orig}}{{ext}}", "exts": [".pdf", ".docx"]}
+             for i in range(n_items)]
+    return RuleTable({"default_path_template": str(root / "{YYYY}" / "{YYYYMM}"), "items": items})
+
+def make_tree(cfg: RuleTable, n_files: int):
+    """把 n_files 个空文件轮流分给各类别；另有约 1/10 不匹配任何前缀的杂项文件。"""
+    rules = cfg.rules
+    for d in cfg.dirs(Y, M): d.mkdir(parents=True, exist_ok=True)
+    for j in range(n_files):
+        r = rules[j % len(rules)]
+        name = f"{r.prefix(Y, M)}_{j}.pdf" if j % 10 else f"misc_{j}.txt"
+        open(r.target_dir(Y, M) / name, "wb").close()
+
+def make_sources(d: Path, n: int, size: int = 1024) -> list[Path]:
+    d.mkdir(parents=True, exist_ok=True)
+    data = os.urandom(size)
+    out = []
+    for j in range(n):
+        p = d / f"src_{j}.pdf"; p.write_bytes(data); out.append(p)
+    return out
+
+# ---------- 各项测试 ----------
+def bench_scan(base: Path, n_files: int, n_items: int, repeat: int) -> dict:
+    root = Path(tempfile.mkdtemp(dir=base))
+    try:
+        cfg = make_config(root, n_items)
+        t = time.perf_counter(); make_tree(cfg, n_files); gen = time.perf_counter() - t
+        res = {"bench": "scan", "files": n_files, "items": n_items, "dirs": len(cfg.dirs(Y, M)),
+               "setup_s": round(gen, 2)}
+        res["refresh"] = timeit(lambda: compute_status_and_count(cfg, Y, M), repeat)
+        res["per_item"] = timeit(lambda: [count_for_item(cfg, r, Y, M) for r in cfg.rules], repeat)
+        cache = ScanCache()
+        overview = lambda: sum(len(c) for c in iter_year_matrix(cfg, Y, cache))
+        res["overview_cold"] = timeit(overview, 1)
+        res["overview_warm"] = timeit(overview, repeat)
+        return res
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def bench_classify(base: Path, n_batch: int, n_items: int, workers: int) -> dict:
+    root = Path(tempfile.mkdtemp(dir=base))
+    try:
+        cfg = make_config(root / "out", n_items)
+        srcs = make_sources(root / "in", n_batch)
+        rows = [(cfg.rules[j % len(cfg.rules)].key, str(p), (Y, M)) for j, p in enumerate(srcs)]
+        t = time.perf_counter()
+        summary = kinder_cli.run(cfg, rows, workers, journal_path=root / "journal.jsonl", out=io.StringIO())
+        ms = (time.perf_counter() - t) * 1000
+        return {"bench": "classify", "batch": n_batch, "items": n_items, "workers": workers,
+                "ms": round(ms, 3), "files_per_s": round(n_batch / ms * 1000, 1), "summary": summary}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def bench_conflict(base: Path, n_existing: int, n_moves: int) -> dict:
+    root = Path(tempfile.mkdtemp(dir=base))
+    try:
+        dst = root / "dst"; dst.mkdir()
+        if n_existing: open(dst / "same.pdf", "wb").close()
+        for k in range(1, n_existing): open(dst / f"same-{k}.pdf", "wb").close()
+        srcs = make_sources(root / "in", n_moves, size=0)
+        lat = []
+        t = time.perf_counter()
+        for p in srcs:
+            t1 = time.perf_counter(); move_with_conflict(p, dst / "same.pdf"); lat.append((time.perf_counter() - t1) * 1000)
+        ms = (time.perf_counter() - t) * 1000
+        return {"bench": "conflict", "existing": n_existing, "moves": n_moves, "ms": round(ms, 3),
+                "p50_ms": pct(lat, 0.5), "p95_ms": pct(lat, 0.95), "first_ms": round(lat[0], 3) if lat else 0}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def bench_suggest(n_files: int, n_items: int) -> dict:
+    """
+    Matcher.suggest：每类一条 .pdf glob，外加互相重叠的几类——
+    更长的 .xlsx 关键字（包住 glob 的那段字）、排在最后且正则更长的同名 glob；wrong 应为 0。
+    """
+    items = [{"key": f"pdf{i:03d}", "exts": [".pdf"], "match": {"glob": [f"*item{i:03d}*"]}} for i in range(n_items)]
+    items += [{"key": f"xlsx{i:03d}", "exts": [".xlsx"], "match": {"keywords": [f"bank item{i:03d} statement"]}}
+              for i in range(n_items)]
+    items.append({"key": "late", "exts": [".pdf"], "match": {"glob": ["*statement.pdf"]}})
+    for it in items: it["rename"] = "{orig}{ext}"
+    cfg = RuleTable({"default_path_template": "/tmp/{YYYY}", "items": items})
+    want = {}
+    for j in range(n_files):
+        i = j % n_items
+        if j % 2: want[f"C:/in/{j} bank item{i:03d} statement.xlsx"] = f"xlsx{i:03d}"
+        else: want[f"C:/in/{j} bank item{i:03d} statement.pdf"] = f"pdf{i:03d}"
+    t = time.perf_counter()
+    got = cfg.matcher.suggest(want)
+    ms = (time.perf_counter() - t) * 1000
+    wrong = sum(1 for p, k in want.items() if getattr(got.get(p), "key", None) != k)
+    return {"bench": "suggest", "files": len(want), "items": len(items), "ms": round(ms, 3), "wrong": wrong}
+
+class _FakeApp:
+    """代替 Tk 窗口：after() 用定时器线程执行，_add_files 只计数。"""
+    def __init__(self):
+        self.received, self.flushes = 0, 0
+        self.lock = threading.Lock()
+    def after(self, ms, fn, *args):
+        threading.Timer(ms / 1000, fn, args).start()
+    def _add_files(self, files):
+        with self.lock: self.received += len(files); self.flushes += 1
+
+def bench_ipc(n_senders: int, files_per_sender: int = 1) -> dict:
+    import kinder_classify   # 只用它的 IPC 服务端类；导入 tkinter 模块但不建窗口
+    srv = kinder_classify._Server(("127.0.0.1", 0), kinder_classify._Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    app = _FakeApp(); srv.attach(app)
+    host, port = srv.server_address
+    lat, errors = [], []
+    def send(i):
+        files = [f"C:/bench/{i}_{k}.pdf" for k in range(files_per_sender)]
+        t = time.perf_counter()
+        try:
+            reply = ipc_request(host, port, {"cmd": "add", "files": files})
+            if not (reply and reply.get("ok")): errors.append(str(reply))
+        except OSError as e:
+            errors.append(str(e)); return
+        lat.append((time.perf_counter() - t) * 1000)
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(n_senders)]
+    t = time.perf_counter()
+    for th in threads: th.start()
+    for th in threads: th.join()
+    ms = (time.perf_counter() - t) * 1000
+    want = n_senders * files_per_sender
+    deadline = time.monotonic() + 5
+    while app.received < want - len(errors) * files_per_sender and time.monotonic() < deadline:
+        time.sleep(0.01)
+    srv.shutdown(); srv.server_close()
+    return {"bench": "ipc", "senders": n_senders, "files_per_sender": files_per_sender, "ms": round(ms, 3),
+            "p50_ms": pct(lat, 0.5), "p95_ms": pct(lat, 0.95), "max_ms": pct(lat, 1.0),
+            "delivered": app.received, "expected": want, "ui_flushes": app.flushes, "errors": len(errors)}
+
+# ---------- 入口 ----------
+def ints(s: str) -> list[int]:
+    return [int(x) for x in s.split(",") if x.strip()]
+
+# 各规模参数的默认值；--quick 换成小规模，但只替换用户没指定的那几项
+DEFAULTS = {"files": [10, 1000, 10000, 100000], "items": [10, 100, 500], "batches": [10, 100, 1000],
+            "existing": [0, 100, 1000], "senders": [1, 8, 32, 128]}
+QUICK = {"files": [10, 1000], "items": [10, 100], "batches": [10, 100], "existing": [0, 100], "senders": [1, 8, 32]}
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Kinder Classify 基准测试，结果输出 JSON")
+    ap.add_argument("--files", type=ints, help="目录树文件数，逗号分隔")
+    ap.add_argument("--items", type=ints, help="类别数，逗号分隔")
+    ap.add_argument("--batches", type=ints, help="批量分类的文件数")
+    ap.add_argument("--existing", type=ints, help="冲突测试：目标处已有的同名文件数")
+    ap.add_argument("--senders", type=ints, help="并发“发送到”数")
+    ap.add_argument("--workers", type=int, default=kinder_cli.MOVE_WORKERS)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", help="只跑这些测试：scan,classify,conflict,suggest,ipc")
+    ap.add_argument("--quick", action="store_true", help="小规模（只影响没指定的项）：files 10,1000 / items 10,100 / batches 10,100")
+    ap.add_argument("--dir", help="临时目录放在哪里（默认系统临时目录）")
+    ap.add_argument("--out", help="结果写到文件（默认 stdout）")
+    a = ap.parse_args(argv)
+    for k, v in (QUICK if a.quick else DEFAULTS).items():
+        if getattr(a, k) is None: setattr(a, k, v)
+    only = set(a.only.split(",")) if a.only else {"scan", "classify", "conflict", "suggest", "ipc"}
+    logging.getLogger().setLevel(logging.WARNING)
+
+    base = Path(tempfile.mkdtemp(prefix="kinder_bench_", dir=a.dir))
+    results = []
+    def record(r: dict):
+        results.append(r); print(json.dumps(r, ensure_ascii=False), file=sys.stderr)
+    try:
+        if "scan" in only:
+            for n in a.files:
+                for k in a.items: record(bench_scan(base, n, k, a.repeat))
+        if "classify" in only:
+            for n in a.batches:
+                for k in a.items: record(bench_classify(base, n, k, a.workers))
+        if "conflict" in only:
+            for k in a.existing: record(bench_conflict(base, k, 200))
+        if "suggest" in only:
+            for n in a.batches:
+                for k in a.items: record(bench_suggest(n, k))
+        if "ipc" in only:
+            try:
+                for n in a.senders: record(bench_ipc(n))
+            except ImportError as e:
+                record({"bench": "ipc", "skipped": str(e)})
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+    report = {"env": {"python": sys.version.split()[0], "platform": platform.platform(),
+                      "cpus": os.cpu_count(), "dir": str(base.parent), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if a.out: Path(a.out).write_text(text, encoding="utf-8")
+    else: print(text)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
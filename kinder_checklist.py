@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+清单树（类别 → 状态 | 数量）的同步逻辑：主程序与 Checklist Viewer 共用
+- 树与规则表同步：首次全建；配置热加载后只增删 / 挪动有变化的行，状态列按差异改
+- 刷新：每个目标目录只列一次（走 ScanCache，另一个窗口刚列过的不再列）
+- 监视：目录有变化只重算受影响的类别
+使用方（tk 窗口）需有 self.tree、self.cfg、self.watch_var、self.root_hint、current_ym()、set_status()。
+"""
+
+import os
+from datetime import datetime
+from tkinter import messagebox
+
+from kinder_core import (
+    METRICS, ScanCache, SharedScanCache, DirIndex, DirWatcher, apply_changes,
+    compute_status_and_count, count_for_item, diff_rules, grouped_items,
+)
+
+
+class ChecklistMixin:
+    def _init_checklist(self):
+        self._tree_snapshot: dict[str, str] = {}
+        self._index, self._index_ym, self._status, self._counts = DirIndex(), None, {}, {}
+        self.watcher = None
+        # 目录列表按 mtime 缓存（刷新、年度总览共用）；落盘一份与另一个窗口共享，对方刚列过的目录这边不再列
+        self._scan_cache = ScanCache(SharedScanCache.open())
+
+    def _close_checklist(self):
+        if self.watcher: self.watcher.stop(); self.watcher = None
+        self._scan_cache.close()
+
+    def _ok_summary(self) -> str:
+        ok_ct = sum(1 for k in self._counts if self._status.get(k, False))
+        return f"{ok_ct}/{len(self._counts)}"
+
+    # ---------- 刷新：整表重算（状态与数量来自同一次扫描） ----------
+    def _rescan(self):
+        y, m = self.current_ym()
+        self.root_hint.set(self.cfg.root_hint(y, m))
+        self._index, self._index_ym = DirIndex(self._scan_cache), (y, m)
+        self._status, self._counts = compute_status_and_count(self.cfg, y, m, self._index)
+        self._update_tree(self._status, self._counts)
+        self._update_watch()
+
+    # ---------- 清单树：与规则表同步（首次全建；之后只增删/挪动有变化的行），状态列按差异改 ----------
+    def _build_tree(self):
+        with METRICS.span("tree_build"):
+            order, groups = grouped_items(self.cfg.rules)
+            keep = set()
+            for gi, g in enumerate(order):
+                gid = f"grp:{g}"; keep.add(gid)
+                if not self.tree.exists(gid):
+                    self.tree.insert("", gi, iid=gid, text=f"—— {g} ——", tags=("group",), open=True)
+                elif self.tree.index(gid) != gi:
+                    self.tree.move(gid, "", gi)
+                i = 0
+                for it in groups[g]:
+                    if it.key in keep: continue   # 重复 key 只显示一行
+                    if not self.tree.exists(it.key):
+                        self.tree.insert(gid, i, iid=it.key, text=it.key, values=("",))
+                    elif self.tree.parent(it.key) != gid or self.tree.index(it.key) != i:
+                        self.tree.move(it.key, gid, i)
+                    keep.add(it.key); i += 1
+            for gid in self.tree.get_children(""):
+                for k in self.tree.get_children(gid):
+                    if k not in keep: self.tree.delete(k); self._tree_snapshot.pop(k, None)
+                if gid not in keep: self.tree.delete(gid)
+
+    def _update_tree(self, status: dict, counts: dict) -> int:
+        changed = 0
+        with METRICS.span("tree"):
+            for key, cnt in counts.items():
+                v = f"{'✅' if status.get(key, False) else '⬜'}[{cnt}]"
+                if self._tree_snapshot.get(key) != v and self.tree.exists(key):
+                    self.tree.set(key, "status", v)
+                    self._tree_snapshot[key] = v; changed += 1
+        return changed
+
+    def _reload_rules(self, table):
+        """配置热加载：按差异更新树与计数；没改的类别连同缓存原样保留。返回 (新增, 删除, 修改) 的 key。"""
+        added, removed, changed = diff_rules(self.cfg, table)
+        self.cfg = table
+        self._build_tree()
+        y, m = self.current_ym()
+        for k in removed:
+            self._status.pop(k, None); self._counts.pop(k, None)
+        for k in added | changed:
+            r = table.by_key[k]
+            cnt = count_for_item(table, r, y, m, self._index)
+            self._counts[k], self._status[k] = cnt, r.present(cnt)
+            self._tree_snapshot.pop(k, None)
+        self._update_tree(self._status, self._counts)
+        self.root_hint.set(table.root_hint(y, m))
+        self._update_watch()
+        if getattr(self, "_overview", None) is not None and self._overview.winfo_exists():
+            self._overview.set_config(table)
+        return added, removed, changed
+
+    # ---------- 监视模式：目录有变化只重算受影响的类别 ----------
+    def _update_watch(self):
+        if not self.watch_var.get():
+            if self.watcher: self.watcher.stop(); self.watcher = None
+            return
+        if not self.watcher:
+            self.watcher = DirWatcher(lambda ch: self.after(0, self._on_fs_change, ch))
+        y, m = self.current_ym()
+        self.watcher.set_dirs(self.cfg.dirs(y, m))
+
+    def _on_fs_change(self, changes: dict):
+        y, m = self.current_ym()
+        if self._index_ym != (y, m): return
+        with METRICS.span("watch", dirs=len(changes)):
+            apply_changes(self._index, changes)
+            for r in self.cfg.rules:
+                if str(r.target_dir(y, m)) not in changes: continue
+                cnt = count_for_item(self.cfg, r, y, m, self._index)
+                self._counts[r.key] = cnt
+                self._status[r.key] = r.present(cnt)
+            changed = self._update_tree(self._status, self._counts)
+        if changed:
+            self.set_status(f"目录有变化，已更新（{datetime.now():%H:%M:%S}）：{self._ok_summary()} 类满足")
+
+    # ---------- 年度总览 / 打开目录 ----------
+    def show_overview(self):
+        from kinder_overview import open_overview   # 用到才加载
+        open_overview(self, self.cfg, self._scan_cache, self.current_ym()[0])
+
+    def open_dir_of_selected(self, event=None):
+        sel = self.tree.selection()
+        if not sel: return
+        iid = sel[0]
+        if self.tree.get_children(iid): return   # 组标题行
+        key = self.tree.item(iid, "text")        # 左列“文件类别”
+        y, m = self.current_ym()
+        it = self.cfg.by_key.get(key)
+        if not it: return
+        d = it.target_dir(y, m)
+        try: d.mkdir(parents=True, exist_ok=True); os.startfile(str(d))
+        except Exception as e: messagebox.showerror("打开失败", str(e))
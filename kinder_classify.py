@@ -2,21 +2,67 @@
 # -*- coding: utf-8 -*-
 """
 Kinder Classify
-- 单实例 + IPC：二次启动只把文件追加到现有窗口
-- 拖拽（tkinterdnd2 可用则用；不可用则正常运行）
-- 撤销/重做：一次一步；撤销回到列表，重做从列表移除
-- 清单树：左“文件类别”，右“状态 | 数量”（勾选依据磁盘现状）
+- 单实例 + IPC：二次启动只把文件追加到现有窗口；同一端口也答脚本的 status / classify / undo / metrics 查询
+- 拖拽（tkinterdnd2 可用则用；不可用则正常运行）；拖入/“发送到”文件夹时后台递归列出文件，边找边加，Esc 可取消
+- 撤销/重做：一次撤回/重做一整批分类；撤销回到列表，重做从列表移除
+- 撤销/重做记录写入 kinder_classify.journal.jsonl，关窗或崩溃后重开仍可撤销
+- 搬移/撤销/重做在后台线程池执行，状态栏显示进度，Esc 可取消整批
+- 清单树：左“文件类别”，右“状态 | 数量”（勾选依据磁盘现状）；可选“实时监视目录”自动更新
 - 状态栏提示（成功/刷新/撤销/重做等），仅错误弹窗
 
 【ver12本次改动】
 1) 中間待辦文件列表雙擊可打開文件。
 """
 
-import os, sys, json, shutil, logging, socket, threading, socketserver
+import os, sys, time
+_T0 = time.perf_counter()   # 启动计时起点（写进日志的 STARTUP 行）
+
+# 单实例 / IPC
+IPC_HOST, IPC_PORT = "127.0.0.1", 53451
+
+def _fast_send(files: list[str]) -> bool:
+    """
+    “发送到”快速通道：只用 socket + json，把文件交给已开着的窗口就退出，不加载 tkinter / 核心模块。
+    协议同 kinder_core.ipc_request（一行 JSON，等一行应答）。连不上返回 False，走正常启动。
+    """
+    import socket, json
+    try:
+        with socket.create_connection((IPC_HOST, IPC_PORT), timeout=0.8) as s:
+            s.settimeout(5.0)
+            s.sendall(json.dumps({"cmd": "add", "files": files}, ensure_ascii=False).encode("utf-8") + b"\n")
+            try: s.makefile("rb").readline()
+            except OSError: pass
+        return True
+    except OSError:
+        return False
+
+_FAST_TRIED = False
+if __name__ == "__main__" and len(sys.argv) > 1 and not sys.argv[1].startswith("--"):
+    _files = [os.path.normpath(p) for p in sys.argv[1:] if os.path.exists(p)]
+    if _files:
+        if _fast_send(_files): sys.exit(0)
+        _FAST_TRIED = True
+
+import re, logging, threading, socketserver, queue
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
 from pathlib import Path
-from datetime import datetime
+
+from kinder_core import (
+    JOURNAL, MOVE_WORKERS, load_config, now_ym, parse_ym, render_name, as_rules, Rule,
+    compute_status_and_count, grouped_items, ConfigWatcher,
+    METRICS, setup_logging, setup_metrics, setup_moves, DupIndex, Duplicate, log_event,
+    DirIndex, iter_input_files, Journal, journaled_move, read_msg, write_msg, ipc_request,
+    notify_viewer, msg_field, msg_files,
+)
+
+# 命令行批处理（--classify / --manifest …）：不加载 tkinter，直接走 kinder_cli
+if __name__ == "__main__" and len(sys.argv) > 1 and sys.argv[1].startswith("--"):
+    import kinder_cli
+    sys.exit(kinder_cli.main(sys.argv[1:]))
+
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
+from kinder_checklist import ChecklistMixin
 
 # ---------- 拖拽支持 ----------
 try:
@@ -28,144 +74,236 @@ except Exception:
     DND_FILES = "DND_FALLBACK"
     HAS_DND = False
 
-# ---------- 配置与日志 ----------
-SCRIPT_DIR = Path(__file__).resolve().parent
-CANDIDATES = [
-    SCRIPT_DIR,
-    Path(r"E:/ShangJin_Kindergarten/KinderClassify"),
-    Path(r"E:\ShangJin_Kindergarten\KinderClassify"),
-]
-CONFIG = None; LOG = None
-for base in CANDIDATES:
-    cfg = base / "config.json"
-    if cfg.exists():
-        CONFIG = cfg; LOG = base / "kinder_classify.log"; break
-if CONFIG is None:
-    CONFIG = SCRIPT_DIR / "config.json"
-    LOG = SCRIPT_DIR / "kinder_classify.log"
-
-logging.basicConfig(filename=str(LOG), level=logging.INFO,
-                    format="%(asctime)s [%(levelname)s] %(message)s")
+_T_IMPORTS = time.perf_counter()
+
+
+# ---------- 后台文件操作 ----------
+CANCELLED = object()   # 批次被取消、未执行的任务结果
+
+class FileOpExecutor:
+    """
+    有界线程池 + 结果队列：搬移在后台并发执行，UI 线程用 after() 轮询结果、更新进度。
+    每个批次的结果按提交顺序回传，便于按顺序记录撤销栈。
+    """
+    def __init__(self, root: tk.Misc, workers: int = MOVE_WORKERS):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fileop")
+        self._q: queue.Queue = queue.Queue()
+        self._cancel = threading.Event()
+        self._batch = None
+
+    @property
+    def busy(self) -> bool:
+        return self._batch is not None
+
+    def run(self, jobs: list[tuple], fn, on_finish, on_progress=None):
+        """jobs: [args, ...]；fn(*args) 在工作线程执行；on_finish(results) 在 UI 线程回调。"""
+        self._cancel.clear()
+        self._batch = {"n": len(jobs), "done": 0, "results": [CANCELLED] * len(jobs),
+                       "on_finish": on_finish, "on_progress": on_progress}
+        for i, args in enumerate(jobs):
+            self._pool.submit(self._job, i, fn, args)
+        self.root.after(50, self._pump)
+
+    def cancel(self):
+        if self.busy: self._cancel.set()
+
+    def shutdown(self):
+        # 未开始的任务直接取消；已在搬的文件让其搬完（线程池在退出时 join）
+        self._cancel.set()
+        self._pool.shutdown(wait=False)
+
+    def _job(self, i, fn, args):
+        if self._cancel.is_set():
+            self._q.put((i, CANCELLED)); return
+        try:
+            r = fn(*args)
+        except Exception as e:
+            logging.exception("file op error: %s", e)
+            r = e
+        self._q.put((i, r))
 
-# 单实例 / IPC
-IPC_HOST, IPC_PORT = "127.0.0.1", 53451
+    def _pump(self):
+        b = self._batch
+        try:
+            while True:
+                i, r = self._q.get_nowait()
+                b["results"][i] = r; b["done"] += 1
+        except queue.Empty:
+            pass
+        if b["done"] < b["n"]:
+            if b["on_progress"]: b["on_progress"](b["done"], b["n"])
+            self.root.after(50, self._pump); return
+        self._batch = None
+        b["on_finish"](b["results"])
+
+
+# ---------- 后台收文件：拖入 / “发送到”的文件夹边列边加 ----------
+class FileIngest:
+    """
+    路径判断（exists / is_dir）与递归列目录都在后台线程做，UI 线程用 after() 轮询，
+    每攒够一批（或过了 0.1 秒）就交给 on_chunk 追加到待办列表，首批文件几乎马上可用。
+    同时可有多路收取；cancel() 停掉当前所有收取，之后的新收取不受影响。
+    """
+    CHUNK = 500
+    FLUSH_S = 0.1
+
+    def __init__(self, root: tk.Misc, on_chunk, on_done):
+        self.root, self.on_chunk, self.on_done = root, on_chunk, on_done
+        self._q: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._jobs = 0            # 仅 UI 线程读写
+        self._pumping = False
+        self.found = 0            # 本轮（直到全部收完）已找到的文件数
+
+    @property
+    def busy(self) -> bool:
+        return self._jobs > 0
+
+    def start(self, paths, exts=None):
+        if not self.busy: self.found = 0
+        self._jobs += 1
+        threading.Thread(target=self._work, args=(list(paths), exts, self._stop),
+                         daemon=True, name="ingest").start()
+        if not self._pumping:
+            self._pumping = True; self.root.after(30, self._pump)
+
+    def cancel(self):
+        self._stop.set(); self._stop = threading.Event()
+
+    def _work(self, paths, exts, stop):
+        buf, t = [], time.monotonic()
+        try:
+            with METRICS.span("ingest", paths=len(paths)):
+                for p in iter_input_files(paths, exts, stop):
+                    buf.append(p)
+                    if len(buf) >= self.CHUNK or time.monotonic() - t >= self.FLUSH_S:
+                        self._q.put(buf); buf, t = [], time.monotonic()
+        except Exception:
+            logging.exception("ingest failed: %s", paths[:3])
+        if buf: self._q.put(buf)
+        self._q.put(stop.is_set())   # 结束标记：是否被取消
+
+    def _pump(self):
+        cancelled = False
+        try:
+            while True:
+                r = self._q.get_nowait()
+                if isinstance(r, list):
+                    self.found += len(r); self.on_chunk(r)
+                else:
+                    self._jobs -= 1; cancelled |= r
+        except queue.Empty:
+            pass
+        if self._jobs:
+            self.root.after(50, self._pump)
+        else:
+            self._pumping = False
+            self.on_done(self.found, cancelled)
+
+
+# ---------- 待办文件列表（模型） ----------
+class PendingFiles:
+    """
+    有序的待办文件集合：按路径 O(1) 判重/删除；行号按需从有序 dict 重建（每批一次，不是每个文件一次）。
+    add/remove 返回变化的行号，界面据此只增删对应行，Listbox 与模型行号始终一致。
+    """
+    def __init__(self, paths=()):
+        self._d: dict[str, Path] = {}
+        self._rows: list[Path] = None
+        self._pos: dict[str, int] = None
+        self.add(paths)
+
+    def __len__(self): return len(self._d)
+    def __iter__(self): return iter(self._d.values())
+    def __contains__(self, p): return str(p) in self._d
+
+    def _index(self):
+        if self._rows is None:
+            self._rows = list(self._d.values())
+            self._pos = {k: i for i, k in enumerate(self._d)}
+        return self._rows
+
+    def __getitem__(self, i: int) -> Path:
+        return self._index()[i]
+
+    def add(self, paths) -> list[Path]:
+        """追加（已存在的跳过）；返回实际追加的，顺序即新行顺序（都在末尾）。"""
+        added = []
+        for p in paths:
+            p = Path(p); k = str(p)
+            if k not in self._d:
+                self._d[k] = p; added.append(p)
+        if added and self._rows is not None:
+            n = len(self._rows)
+            self._rows.extend(added)
+            self._pos.update((str(p), n + i) for i, p in enumerate(added))
+        return added
+
+    def remove(self, paths) -> list[int]:
+        """删除；返回被删的行号（升序），供界面删对应行。"""
+        self._index()
+        rows = []
+        for p in paths:
+            k = str(p)
+            if k in self._d:
+                del self._d[k]; rows.append(self._pos[k])
+        if rows: self._rows = self._pos = None
+        return sorted(rows)
+
+    def clear(self):
+        self._d.clear(); self._rows = self._pos = None
+
+    def reorder(self, paths):
+        """按给定顺序重排（同一组文件）；界面随后整表重画。"""
+        self._d = {str(p): Path(p) for p in paths}; self._rows = self._pos = None
 
+    def row_of(self, p):
+        self._index(); return self._pos.get(str(p))
 
-# ---------- 通用工具 ----------
-def load_config():
-    with open(CONFIG, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def now_ym():
-    n = datetime.now(); return n.year, n.month
-
-def fmt_ym(y, m):
-    return f"{y:04d}", f"{m:02d}", f"{y:04d}{m:02d}"
-
-def safe_name(s: str) -> str:
-    for c in '<>:"/\\|?*': s = s.replace(c, "_")
-    return s.rstrip(" .")
-
-def move_with_conflict(src: Path, dst: Path) -> Path:
-    dst.parent.mkdir(parents=True, exist_ok=True)
-    t, i = dst, 1
-    while t.exists():
-        t = dst.with_name(f"{dst.stem}-{i}{dst.suffix}"); i += 1
-    shutil.move(str(src), str(t))
-    return t
-
-def target_dir(cfg: dict, it: dict, y: int, m: int) -> Path:
-    YYYY, MM, YYYYMM = fmt_ym(y, m)
-
-    # 1) 选择路径模板：item 覆盖全局
-    if it.get("path_template"):
-        tpl = it["path_template"]
-    elif cfg.get("default_path_template"):
-        tpl = cfg["default_path_template"]
-    else:
-        # 老规则兜底（保持你原来的行为）
-        return Path(cfg["out_root"]) / f"{YYYYMM}_Unclassified"
-
-    # 2) 先把 dest_subdir 自己也做一次占位符替换
-    raw_sub = it.get("dest_subdir", "")
-    sub = raw_sub.format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM) if raw_sub else ""
-
-    # 3) 套模板本身（支持模板中直接写 {dest_subdir}）
-    base = Path(tpl.format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM, dest_subdir=sub))
-
-    # 4) 如果模板里没写 {dest_subdir}，但配置给了 sub，则在末尾追加
-    if sub and "{dest_subdir}" not in tpl:
-        base = base / sub
-
-    return base
-
-
-def expected_prefix(it: dict, y: int, m: int) -> str:
-    YYYY, MM, _ = fmt_ym(y, m)
-    tpl = it["rename"].replace("{YYYY}", YYYY).replace("{MM}", MM)
-    cut = len(tpl)
-    for token in ("{orig}", "{DD}", "{ext}"):
-        i = tpl.find(token)
-        if i != -1 and i < cut: cut = i
-    return tpl[:cut]
-
-def compute_status(cfg: dict, y: int, m: int) -> dict:
-    status = {}
-    for it in cfg["items"]:
-        d = target_dir(cfg, it, y, m)
-        prefix = expected_prefix(it, y, m)
-        exts = [e.lower() for e in it.get("exts", [])] if it.get("exts") else None
-        cnt = 0
-        if d.exists():
-            for p in d.iterdir():
-                if not p.is_file(): continue
-                if not p.name.startswith(prefix): continue
-                if exts and p.suffix.lower() not in exts: continue
-                cnt += 1
-        rule = it.get("present_rule", {"mode": "any"})
-        ok = (cnt >= int(rule.get("n", 1))) if rule.get("mode") == "count_at_least" else (cnt > 0)
-        status[it["key"]] = ok
-    return status
-
-def count_for_item(cfg: dict, it: dict, y: int, m: int) -> int:
-    d = target_dir(cfg, it, y, m)
-    prefix = expected_prefix(it, y, m)
-    exts = [e.lower() for e in it.get("exts", [])] if it.get("exts") else None
-    cnt = 0
-    if d.exists():
-        for p in d.iterdir():
-            if not p.is_file(): continue
-            if not p.name.startswith(prefix): continue
-            if exts and p.suffix.lower() not in exts: continue
-            cnt += 1
-    return cnt
-
-def group_of(k: str) -> str:
-    l, r = k.find("【"), k.find("】")
-    return k[l+1:r].strip() if (l != -1 and r != -1 and r > l) else "其他"
-
-def grouped_items(items: list[dict]):
-    groups, order = {}, []
-    for it in items:
-        g = group_of(it["key"])
-        if g not in groups:
-            groups[g] = []; order.append(g)
-        groups[g].append(it)
-    return order, groups
+
+class _Tooltip:
+    """悬停 0.4 秒显示 text_fn() 的内容（每次现算），移开即关。"""
+    def __init__(self, widget, text_fn):
+        self.w, self.text_fn, self.tip, self.job = widget, text_fn, None, None
+        widget.bind("<Enter>", lambda e: self._arm(), add="+")
+        widget.bind("<Leave>", lambda e: self._hide(), add="+")
+
+    def _arm(self):
+        self._hide(); self.job = self.w.after(400, self._show)
+
+    def _show(self):
+        self.job = None
+        self.tip = tk.Toplevel(self.w); self.tip.wm_overrideredirect(True)
+        x, y = self.w.winfo_rootx(), self.w.winfo_rooty()
+        lbl = tk.Label(self.tip, text=self.text_fn(), justify="left", background="#ffffe0",
+                       relief="solid", borderwidth=1, font=("Consolas", 9))
+        lbl.pack()
+        self.tip.update_idletasks()
+        self.tip.wm_geometry(f"+{x}+{y - self.tip.winfo_height() - 4}")
+
+    def _hide(self):
+        if self.job: self.w.after_cancel(self.job); self.job = None
+        if self.tip: self.tip.destroy(); self.tip = None
 
 
 # ---------- 主应用 ----------
-class App(TkinterDnD.Tk):
+class App(ChecklistMixin, TkinterDnD.Tk):
     def __init__(self, cfg: dict, files_cli: list[str]):
         super().__init__()
-        self.cfg = cfg
-        self.files = [Path(f) for f in files_cli if Path(f).exists()]
+        self.cfg = as_rules(cfg)   # 编译后的规则表（rules / by_key）
+        setup_metrics(self.cfg); setup_moves(self.cfg)
+        self.files = PendingFiles()   # 命令行给的文件/文件夹在 _startup 里交给后台收取
+        self._suggest: dict[str, str] = {}   # 自动建议：路径 → 类别 key
         self.title("Kinder Classify")
         self.geometry("1120x700")
 
-        # 撤销/重做栈：entry = {"orig": str, "dst": str, "current": str}
-        self.undo_stack: list[dict] = []
-        self.redo_stack: list[dict] = []
+        # 撤销/重做：持久化日志，一次分类 = 一个事务；entry = {"orig", "dst", "current", "state"}
+        self.journal = Journal(JOURNAL)
+        self._init_checklist()            # 清单树、目录索引与扫描缓存（与 Checklist Viewer 共用）
+        self.dups = DupIndex()            # 目标目录的内容指纹：同一份文件不重复归档
+        self._dup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dupcheck")   # 各批查重排队做
+        self._dup_session = None          # ((年月, 规则表), DupChecker)：一次收取里各批共用，目标目录只同步一次
 
         y0, m0 = now_ym()
         self.year_var = tk.StringVar(value=str(y0))
@@ -176,6 +314,12 @@ class App(TkinterDnD.Tk):
             w.bind("<Control-z>", lambda e: self.cmd_undo())
             w.bind("<Control-y>", lambda e: self.cmd_redo())
             w.bind("<F5>",       lambda e: self.refresh_status())
+            w.bind("<Escape>",   lambda e: self.cmd_cancel())
+
+        self.ops = FileOpExecutor(self)
+        self.ingest = FileIngest(self, self._ingest_chunk, self._ingest_done)
+        self._files_cli, self._ingested = files_cli, 0
+        self.watch_var = tk.BooleanVar(value=bool(cfg.get("watch", False)))
 
         # ===== 布局 =====
         frm = ttk.Frame(self, padding=10); frm.pack(fill=tk.BOTH, expand=True)
@@ -253,18 +397,15 @@ class App(TkinterDnD.Tk):
                 _bind_scrollwheel(child)
         # —— 改进结束 —— #
 
-        # 样式与按钮生成（保持不变）
-        s = ttk.Style(self); s.configure("Left.TButton", anchor="w", padding=(6, 4))
-        order, groups = grouped_items(cfg["items"])
-        for g in order:
-            ttk.Label(left, text=f"—— {g} ——", foreground="#666").pack(anchor="w", pady=(8, 2))
-            ttk.Separator(left, orient="horizontal").pack(fill="x", pady=(0, 4))
-            for it in groups[g]:
-                ttk.Button(left, text=it["key"], style="Left.TButton",
-                           command=lambda _it=it: self.assign(_it)).pack(fill=tk.X, pady=1)
-
-        # 绑定滚轮到可滚动区及其子控件，使鼠标停在列表上即可滚动
+        # 绑定滚轮到可滚动区（之后新建的分组/按钮在 _build_buttons 里各自绑定），使鼠标停在列表上即可滚动
         _bind_scrollwheel(left)
+        self._left, self._bind_scrollwheel = left, _bind_scrollwheel
+
+        # 样式与按钮生成：每组一个 Frame，配置热加载时只增删/重排有变化的组
+        s = ttk.Style(self); s.configure("Left.TButton", anchor="w", padding=(6, 4))
+        self._btn_groups: dict[str, ttk.Frame] = {}
+        self._btn_order: dict[str, list[str]] = {}
+        self._btns: dict[str, ttk.Button] = {}
 
         # ---------------- 中栏：待分类文件 + 状态栏 + 按钮（保持原样） ----------------
         mid = ttk.Frame(frm); mid.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=(0, 10))
@@ -283,10 +424,15 @@ class App(TkinterDnD.Tk):
         ttk.Button(btn_mid, text="添加文件…", command=self.add_files_dialog).pack(side=tk.LEFT)
         ttk.Button(btn_mid, text="移除所选", command=self.remove_selected).pack(side=tk.LEFT, padx=6)
         ttk.Button(btn_mid, text="清空列表", command=self.clear_files).pack(side=tk.LEFT)
+        ttk.Button(btn_mid, text="按文件名建议", command=self.cmd_suggest).pack(side=tk.LEFT, padx=(12, 0))
+        ttk.Button(btn_mid, text="全部按建议分类", command=self.cmd_apply_suggestions).pack(side=tk.LEFT, padx=6)
+        ttk.Button(btn_mid, text="取消 (Esc)", command=self.cmd_cancel).pack(side=tk.RIGHT)
 
         status_frame = ttk.Frame(mid); status_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=(6, 6))
         self.status_var = tk.StringVar(value="就绪")
-        ttk.Label(status_frame, textvariable=self.status_var, anchor="w", relief="groove").pack(fill=tk.X)
+        status_label = ttk.Label(status_frame, textvariable=self.status_var, anchor="w", relief="groove")
+        status_label.pack(fill=tk.X)
+        if METRICS.enabled: _Tooltip(status_label, METRICS.describe)   # 计时打开时：悬停看最近操作的耗时分解
 
         self.refresh_files()
 
@@ -309,8 +455,19 @@ class App(TkinterDnD.Tk):
         ttk.Button(btn_right, text="刷新 (F5)", command=self.refresh_status).pack(fill=tk.X, pady=4)
         ttk.Button(btn_right, text="撤销 (Ctrl+Z)", command=self.cmd_undo).pack(fill=tk.X, pady=4)
         ttk.Button(btn_right, text="重做 (Ctrl+Y)", command=self.cmd_redo).pack(fill=tk.X, pady=4)
+        ttk.Button(btn_right, text="年度总览", command=self.show_overview).pack(fill=tk.X, pady=4)
+        ttk.Checkbutton(btn_right, text="实时监视目录", variable=self.watch_var,
+                        command=self._update_watch).pack(anchor="w", pady=4)
+
+        self._scan_gen = 0
+        self.snapshot = None   # (年月, 状态, 数量)：IPC status 在别的线程直接读，UI 线程每次改完整个换掉
+        self._t_marks: dict[str, float] = {}
+        # 先让窗口画出来：按钮、清单树与首次扫描都在 mainloop 开始后再做（扫描在后台线程）
+        self.after_idle(lambda: self.after(0, self._startup))
 
-        self.refresh_status()
+        # config.json 改了不用重启：后台校验，合法才按差异更新；不合法继续用旧规则
+        self.cfg_watcher = ConfigWatcher(self.cfg, lambda t: self.after(0, self._on_config_reload, t),
+                                         lambda e: self.after(0, self.set_status, f"配置有误，仍用旧规则：{e}"))
 
     # ---------- ★ 新增方法：双击打开文件 ----------
     def _open_file_from_list(self, event=None):
@@ -369,105 +526,270 @@ class App(TkinterDnD.Tk):
             pass
 
     def _add_files(self, paths):
-        added, exist = 0, {str(p) for p in self.files}
-        for p in paths:
-            pth = Path(os.path.expandvars(p))
-            if pth.exists() and pth.is_file() and str(pth) not in exist:
-                self.files.append(pth); exist.add(str(pth)); added += 1
+        """文件与文件夹都收：判断与递归列目录在后台，找到一批加一批（Esc 取消）。"""
+        paths = [p for p in paths if p]
+        if not paths: return
+        if not self.ingest.busy: self._ingested = 0
+        exts = self.cfg.exts if self.cfg.get("folder_exts", True) else None
+        self.ingest.start(paths, exts)
+
+    def _ingest_chunk(self, paths):
+        added = self.files.add(Path(p) for p in paths)
         if added:
-            self.refresh_files()
-            self.set_status(f"已添加 {added} 个文件")
+            self._ingested += len(added)
+            self._rows_added(added)
+            self._check_dups(added)
+        if self.ingest.busy:
+            self.set_status(f"正在读取文件夹：已找到 {self.ingest.found} 个文件（Esc 取消）")
+
+    def _ingest_done(self, found: int, cancelled: bool):
+        self._dup_session = None
+        n = self._ingested
+        if cancelled: self.set_status(f"已取消读取文件夹：已添加 {n} 个文件")
+        elif n: self.set_status(f"已添加 {n} 个文件" + (f"（{found - n} 个已在列表中）" if found > n else ""))
+        elif found: self.set_status(f"{found} 个文件都已在列表中")
+        else: self.set_status("没有找到可添加的文件")
+
+    # —— 查重：新加入的文件在后台与本月各目标目录比对，已有相同内容的行标成橙色 ——
+    def _dup_mode(self) -> str:
+        return self.cfg.get("duplicates", "skip")   # skip：不搬并留在列表 / flag：照搬但提示 / off
+
+    def _check_dups(self, paths):
+        if self._dup_mode() == "off": return
+        key = (self.current_ym(), self.cfg)
+        if self._dup_session is None or self._dup_session[0] != key:
+            self._dup_session = (key, self.dups.checker(self.cfg.dirs(*key[0])))
+        checker = self._dup_session[1]
+        if not self.ingest.busy: self._dup_session = None   # 单次添加：下次重新同步（目录可能已变）
+        def work():
+            try: hits = checker.find(paths)
+            except Exception: logging.exception("duplicate check failed"); return
+            if hits: self.after(0, self._mark_dups, hits)
+        self._dup_pool.submit(work)
+
+    def _mark_dups(self, hits: dict):
+        n = 0
+        for src, ex in hits.items():
+            row = self.files.row_of(src)
+            if row is None: continue
+            self.file_list.itemconfig(row, foreground="#c60"); n += 1
+        if n:
+            ex = next(iter(hits.values()))
+            self.set_status(f"{n} 个文件本月已归档过相同内容（橙色），如：{ex.name}")
 
     def remove_selected(self):
-        for i in reversed(self.file_list.curselection()):
-            del self.files[i]
-        self.refresh_files()
+        rows = self.file_list.curselection()
+        self._rows_removed(self.files.remove([self.files[i] for i in rows]))
 
     def clear_files(self):
-        self.files.clear()
+        self.files.clear(); self._suggest.clear()
         self.refresh_files()
 
+    # —— 列表视图：只增删变化的行 ——
+    def _rows_added(self, paths):
+        # 用户已选了行（例如文件夹还在一批批加进来）就不动选择，否则分类时只剩第一行
+        keep = bool(self.file_list.curselection())
+        if paths:
+            self.file_list.insert(tk.END, *map(self._row_text, paths))
+        if not keep: self._select_first_if_any()
+
+    def _rows_removed(self, rows: list[int]):
+        # 连续的行合并成一次 delete(first, last)，从后往前删以免行号错位
+        runs, start, prev = [], None, None
+        for r in rows:
+            if start is not None and r == prev + 1:
+                prev = r; continue
+            if start is not None: runs.append((start, prev))
+            start = prev = r
+        if start is not None: runs.append((start, prev))
+        for a, b in reversed(runs):
+            self.file_list.delete(a, b)
+        self._select_first_if_any()
+
     def refresh_files(self):
         self.file_list.delete(0, tk.END)
-        for p in self.files:
-            self.file_list.insert(tk.END, str(p))
+        if len(self.files):
+            self.file_list.insert(tk.END, *map(self._row_text, self.files))
         # 总是默认选中第一个
         self._select_first_if_any()
 
+    # ---------- 启动：窗口先出来，内容随后分批填 ----------
+    def _startup(self):
+        self._startup_mark("window")
+        self.root_hint.set(self.cfg.root_hint(*self.current_ym()))
+        self._build_tree()
+        self._refresh_async()
+        self._build_buttons_step()
+        if self._files_cli: self._add_files(self._files_cli)
+
+    def _build_buttons_step(self):
+        if self._build_buttons(budget=40): self.after(1, self._build_buttons_step)
+        else: self._startup_mark("buttons")
+
+    def _refresh_async(self):
+        """首次扫描放后台线程；期间用户按了 F5 / 换了年月则丢弃结果。"""
+        y, m = self.current_ym(); cfg, gen = self.cfg, self._scan_gen
+        self.set_status("正在扫描目标目录…")
+        def work():
+            idx = DirIndex(self._scan_cache)
+            try: st, cn = compute_status_and_count(cfg, y, m, idx)
+            except Exception: logging.exception("first scan failed"); return
+            self.after(0, self._scan_done, gen, cfg, (y, m), idx, st, cn)
+        threading.Thread(target=work, daemon=True).start()
+
+    def _scan_done(self, gen, cfg, ym, idx, st, cn):
+        if gen != self._scan_gen or cfg is not self.cfg or ym != self.current_ym(): return
+        self._index, self._index_ym, self._status, self._counts = idx, ym, st, cn
+        self._update_tree(st, cn)
+        self._update_watch()
+        self.set_status("就绪")
+        self._startup_mark("scan")
+
+    def _startup_mark(self, what: str):
+        if "done" in self._t_marks: return
+        self._t_marks[what] = time.perf_counter()
+        if {"buttons", "scan"} <= self._t_marks.keys():
+            self._t_marks["done"] = 0
+            ms = lambda t: (t - _T0) * 1000
+            logging.info("STARTUP: imports %.0fms, window %.0fms, buttons %.0fms, first scan %.0fms, rules %d",
+                         ms(_T_IMPORTS), ms(self._t_marks["window"]), ms(self._t_marks["buttons"]),
+                         ms(self._t_marks["scan"]), len(self.cfg.rules))
+
     def refresh_status(self):
+        self._scan_gen += 1
         y, m = self.current_ym()
-        YYYY, MM, YYYYMM = fmt_ym(y, m)
-        if self.cfg.get("default_path_template"):
-            self.root_hint.set(self.cfg["default_path_template"].format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM))
-        else:
-            self.root_hint.set(f"{self.cfg['out_root']}/{YYYYMM}_Unclassified")
+        with METRICS.span("refresh", ym=f"{y:04d}{m:02d}"): self._rescan()
+        self.set_status("刷新成功")
 
-        for i in self.tree.get_children():
-            self.tree.delete(i)
+    # ---------- 后台操作控制 ----------
+    def _ops_busy(self) -> bool:
+        if self.ops.busy:
+            self.set_status("文件操作进行中，请稍候（Esc 取消）"); return True
+        return False
 
-        status = compute_status(self.cfg, y, m)
-        order, groups = grouped_items(self.cfg["items"])
+    def cmd_cancel(self):
+        if self.ingest.busy:
+            self.ingest.cancel(); self.set_status("正在取消读取文件夹…")
+        if self.ops.busy:
+            self.ops.cancel(); self.set_status("正在取消：已开始的文件会搬完…")
+
+    def _progress(self, label: str):
+        return lambda done, n: self.set_status(f"{label}：{done}/{n}（Esc 取消）")
+
+    # ---------- 左栏按钮：与规则表同步（首次全建；热加载只动有变化的组） ----------
+    def _build_buttons(self, budget: int = 0) -> bool:
+        """budget > 0：本次最多新建约 budget 个按钮（以组为单位），返回是否还有没建完的组。"""
+        order, groups = grouped_items(self.cfg.rules)
+        for g in [g for g in self._btn_groups if g not in groups]:
+            self._btn_groups.pop(g).destroy(); self._btn_order.pop(g, None)
+        for k in [k for k in self._btns if k not in self.cfg.by_key]:
+            self._btns.pop(k).destroy()
+        regroup = list(self._btn_groups) != order
+        made = 0; more = False
         for g in order:
-            parent = self.tree.insert("", tk.END, text=f"—— {g} ——", tags=("group",), open=True)
-            for it in groups[g]:
-                cnt = count_for_item(self.cfg, it, y, m)
-                mark = "✅" if status.get(it["key"], False) else "⬜"
-                self.tree.insert(parent, tk.END, text=it["key"], values=(f"{mark}[{cnt}]",))
-        self.set_status("刷新成功")
-
-    # ---------- 撤销 / 重做（一次一步） ----------
+            if budget and made >= budget:
+                more = True; break
+            box = self._btn_groups.get(g)
+            if box is None:
+                box = self._btn_groups[g] = ttk.Frame(self._left)
+                ttk.Label(box, text=f"—— {g} ——", foreground="#666").pack(anchor="w", pady=(8, 2))
+                ttk.Separator(box, orient="horizontal").pack(fill="x", pady=(0, 4))
+                self._bind_scrollwheel(box); regroup = True
+            keys = list(dict.fromkeys(r.key for r in groups[g]))   # 重复 key 只一个按钮
+            if self._btn_order.get(g) == keys: continue
+            for k in keys:
+                b = self._btns.get(k)
+                if b is None:
+                    b = self._btns[k] = ttk.Button(box, text=k, style="Left.TButton",
+                                                   command=lambda k=k: self.assign(self.cfg.by_key[k]))
+                    self._bind_scrollwheel(b); made += 1
+                b.pack_forget(); b.pack(fill=tk.X, pady=1)
+            self._btn_order[g] = keys
+        if regroup:
+            self._btn_groups = {g: self._btn_groups[g] for g in order if g in self._btn_groups}
+            for box in self._btn_groups.values(): box.pack_forget()
+            for box in self._btn_groups.values(): box.pack(fill=tk.X)
+        return more
+
+    def _on_config_reload(self, table):
+        """配置热加载：按差异更新按钮、树与计数；没改的类别连同缓存原样保留。"""
+        added, removed, changed = self._reload_rules(table)
+        setup_moves(table)
+        self._build_buttons()
+        logging.info("CONFIG RELOADED: +%d -%d ~%d", len(added), len(removed), len(changed))
+        self.set_status(f"配置已重新加载：新增 {len(added)}，删除 {len(removed)}，修改 {len(changed)}")
+
+    def _update_tree(self, status: dict, counts: dict) -> int:
+        changed = super()._update_tree(status, counts)
+        self.snapshot = (self._index_ym, dict(status), dict(counts))
+        return changed
+
+    # ---------- 撤销 / 重做（一次一批：整个分类事务） ----------
     def cmd_undo(self):
-        if not self.undo_stack:
+        """返回被撤销事务的标签；没有可撤销 / 正忙返回 None。"""
+        if self._ops_busy(): return
+        plan = self.journal.peek("undo")
+        if not plan:
             self.set_status("没有可撤销的操作"); return
-        entry = self.undo_stack.pop()
-
-        cur = Path(entry["current"])  # 当前真实位置（通常为目标位置）
-        if not cur.exists():
-            self.redo_stack.append(entry)
-            self.set_status("撤销跳过：文件不存在"); return
-
-        orig = Path(entry["orig"])
-        tgt, i = orig, 1
-        while tgt.exists():
-            tgt = orig.with_name(f"{orig.stem}-undo{i}{orig.suffix}"); i += 1
-
-        cur = cur.rename(tgt)
-        entry["current"] = cur
-        # 撤销：回到待办列表
-        if all(Path(x) != cur for x in self.files):
-            self.files.append(cur)
-        self.redo_stack.append(entry)
-        self.refresh_files()
-        self.refresh_status()
-        self.set_status("撤销成功：1 个")
+        T, label, items = plan
+
+        def work(i: int, cur: Path, orig: Path):
+            # 当前真实位置（通常为目标位置）→ 原路径（冲突则 -undoN）
+            return journaled_move(self.journal, T, i, cur, orig, "undo")
+
+        def done(results):
+            self.journal.sync()
+            # 撤销：回到待办列表；清单窗口只重列受影响的目录
+            self._rows_added(self.files.add(r for r in results if isinstance(r, Path)))
+            dirs = {os.path.dirname(e["current"]) for (i, e), r in zip(items, results) if isinstance(r, Path)}
+            if dirs: notify_viewer({"cmd": "refresh", "dirs": sorted(dirs)})
+            self.refresh_status()
+            self.set_status(self._batch_msg("撤销", label, results))
+
+        self.ops.run([(i, Path(e["current"]), Path(e["orig"])) for i, e in items], work, done,
+                     self._progress(f"撤销 {label}"))
+        return label
 
     def cmd_redo(self):
-        if not self.redo_stack:
+        """同 cmd_undo，返回被重做事务的标签。"""
+        if self._ops_busy(): return
+        plan = self.journal.peek("redo")
+        if not plan:
             self.set_status("没有可重做的操作"); return
-        entry = self.redo_stack.pop()
-
-        cur = Path(entry["current"])  # 撤销后当前应位于“orig 或其 -undoK”路径
-        if not cur.exists():
-            self.undo_stack.append(entry)
-            self.set_status("重做跳过：文件不存在"); return
-
-        dst = Path(entry["dst"])
-        old = cur                               # ← 记录移动前路径（关键）
-        final = move_with_conflict(cur, dst)    # 执行重做移动
-        entry["current"] = final
-        # 修复点：从待办列表移除“旧路径 old”，而不是 final
-        try:
-            self.files = [p for p in self.files if Path(p) != old]
-        except Exception:
-            pass
-
-        self.undo_stack.append(entry)
-        self.refresh_files()
-        self.refresh_status()
-        self.set_status("重做成功：1 个")
+        T, label, items = plan
+
+        def work(i: int, cur: Path, dst: Path):
+            # 撤销后当前应位于“orig 或其 -undoK”路径
+            return journaled_move(self.journal, T, i, cur, dst, "redo")
+
+        def done(results):
+            self.journal.sync()
+            # 从待办列表移除“旧路径”，而不是 final
+            moved = [e["current"] for (i, e), r in zip(items, results) if isinstance(r, Path)]
+            self._rows_removed(self.files.remove(moved))
+            finals = [str(r) for r in results if isinstance(r, Path)]
+            if finals: notify_viewer({"cmd": "add", "files": finals})
+            self.refresh_status()
+            self.set_status(self._batch_msg("重做", label, results))
+
+        self.ops.run([(i, Path(e["current"]), Path(e["dst"])) for i, e in items], work, done,
+                     self._progress(f"重做 {label}"))
+        return label
+
+    def _batch_msg(self, what: str, label: str, results: list) -> str:
+        ok = sum(1 for r in results if isinstance(r, Path))
+        msg = f"{what}成功：{ok} 个（{label}）"
+        missing = sum(1 for r in results if r is None)
+        cancelled = sum(1 for r in results if r is CANCELLED)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if missing: msg += f"；文件不存在跳过 {missing} 个"
+        if cancelled: msg += f"；已取消 {cancelled} 个"
+        if errors: msg += f"；失败 {len(errors)} 个：{errors[0]}"
+        return msg
 
     # ---------- 分类 ----------
-    def assign(self, it: dict):
+    def assign(self, it: Rule):
+        if self._ops_busy(): return
         sel = list(self.file_list.curselection())
         if not sel:
             sel = list(range(len(self.files)))
@@ -475,105 +797,331 @@ class App(TkinterDnD.Tk):
             self.set_status("没有可分类的文件"); return
 
         y, m = self.current_ym()
-        cnt_ok = cnt_skip_ext = cnt_skip_missing = 0
-        for idx in sorted(sel, reverse=True):
-            src = self.files[idx]
-            if not Path(src).exists():
-                cnt_skip_missing += 1; del self.files[idx]; continue
-            exts = [e.lower() for e in it.get("exts", [])] if it.get("exts") else None
-            if exts and Path(src).suffix.lower() not in exts:
-                cnt_skip_ext += 1; continue
-
-            YYYY, MM, YYYYMM = fmt_ym(y, m)
-            newname = it["rename"].format(
-                key=it["key"], YYYY=YYYY, MM=MM, YYYYMM=YYYYMM,
-                DD=f"{datetime.now().day:02d}",
-                orig="_"+safe_name(Path(src).stem), ext=Path(src).suffix
-            )
-            dst = target_dir(self.cfg, it, y, m) / newname
-            final = move_with_conflict(Path(src), dst)
-
-            entry = {"orig": str(src), "dst": str(dst), "current": str(final)}
-            self.undo_stack.append(entry); cnt_ok += 1
-            del self.files[idx]
-            logging.info(f"MOVED: {src} -> {final}")
-
-        if cnt_ok: self.redo_stack.clear()
+        jobs, cnt_skip_ext = self._jobs_for(it, [Path(self.files[i]) for i in sorted(sel)], y, m)
+        if not jobs:
+            self.set_status(f"{it['key']}：扩展名不匹配跳过 {cnt_skip_ext} 个"); return
+        self._move_batch(it.key, jobs, {it.target_dir(y, m)}, cnt_skip_ext)
+
+    def _jobs_for(self, it: Rule, srcs, y: int, m: int):
+        """[(src, dst), ...] 与扩展名不匹配的个数。"""
+        d, jobs, skip = it.target_dir(y, m), [], 0
+        for src in srcs:
+            if not it.accepts(src): skip += 1; continue
+            jobs.append((src, d / render_name(it, y, m, src)))
+        return jobs, skip
+
+    def api_classify(self, key: str, files: list[str], ym, done=None) -> dict:
+        """IPC classify：与点类别按钮同一条路径（一个事务、可撤销）；年月可指定，文件不必在列表里。"""
+        it = self.cfg.by_key.get(key)
+        if it is None: return {"ok": False, "error": f"unknown key: {key}"}
+        if self.ops.busy: return {"ok": False, "error": "busy"}
+        jobs, skip = self._jobs_for(it, [Path(f) for f in files], *ym)
+        if not jobs:
+            if done: done.set_result({"moved": 0})
+            return {"ok": True, "queued": 0, "ext_skip": skip}
+        T = self._move_batch(it.key, jobs, {it.target_dir(*ym)}, skip, on_done=done.set_result if done else None)
+        return {"ok": True, "tx": T, "queued": len(jobs), "ext_skip": skip}
+
+    def _move_batch(self, label: str, jobs: list[tuple], dirs, cnt_skip_ext: int = 0, on_done=None) -> str:
+        """
+        一批 (src, dst) 作为一个事务在后台搬移（撤销时整批撤回），完成后刷新一次；返回事务号。
+        on_done(summary)：搬完后在 UI 线程回调各结果的计数与落地路径（IPC classify 等结果用）。
+        """
+        # 提交即从待办列表移出；取消/失败的再放回
+        self._rows_removed(self.files.remove(src for src, _ in jobs))
+
+        T = self.journal.begin(label)
+        mode = self._dup_mode()
+        checker = self.dups.checker(dirs) if mode != "off" else None
+        flagged = []
+
+        def work(i: int, src: Path, dst: Path):
+            # 源文件存在性检查、查重哈希也放在后台，避免网络盘 stat / 读文件卡住界面
+            if checker:
+                ex = checker.match(src)
+                if ex is not None:
+                    log_event("duplicate", tx=T, src=str(src), existing=str(ex), action=mode)
+                    if mode == "skip": return Duplicate(src, ex)
+                    flagged.append(src)
+            r = journaled_move(self.journal, T, i, src, dst, "assign", orig=str(src), dst=str(dst))
+            if checker and r is not None: checker.note(r)
+            return r
+
+        def done(results):
+            # 整批一个事务：撤销时一次撤回
+            self.journal.commit(T)
+            cnt_ok = cnt_skip_missing = cnt_cancel = 0
+            errors, back, dups = [], [], {}
+            for (src, dst), r in zip(jobs, results):
+                if r is None:
+                    cnt_skip_missing += 1
+                elif isinstance(r, Duplicate):
+                    dups[src] = r.existing; back.append(src)
+                elif r is CANCELLED:
+                    cnt_cancel += 1; back.append(src)
+                elif isinstance(r, Exception):
+                    errors.append(r); back.append(src)
+                else:
+                    cnt_ok += 1
+            logging.info("ASSIGN %s tx=%s: moved %d, missing %d, cancelled %d, failed %d",
+                         label, T, cnt_ok, cnt_skip_missing, cnt_cancel, len(errors))
+            self._rows_added(self.files.add(back))
+            if dups: self._mark_dups(dups)
+            # 清单窗口（若开着）按最终路径增量计数，不必整表重扫
+            finals = [str(r) for r in results if isinstance(r, Path)]
+            if finals: notify_viewer({"cmd": "add", "files": finals})
+
+            self.refresh_status()
+            msg = f"{label}：分类成功 {cnt_ok} 个"
+            if cnt_skip_ext: msg += f"；扩展名不匹配跳过 {cnt_skip_ext} 个"
+            if cnt_skip_missing: msg += f"；源文件不存在移除 {cnt_skip_missing} 个"
+            if dups: msg += f"；内容已归档过、跳过 {len(dups)} 个（橙色）"
+            if flagged: msg += f"；其中 {len(flagged)} 个与已有文件内容相同"
+            if cnt_cancel: msg += f"；已取消 {cnt_cancel} 个"
+            if errors: msg += f"；失败 {len(errors)} 个"
+            self.set_status(msg)
+            if on_done:
+                on_done({"moved": cnt_ok, "missing": cnt_skip_missing, "duplicate": len(dups),
+                         "cancelled": cnt_cancel, "failed": len(errors), "dst": finals})
+            if errors:
+                messagebox.showerror("分类失败", f"{len(errors)} 个文件搬移失败，首个错误：\n{errors[0]}")
+
+        self.ops.run([(i, src, dst) for i, (src, dst) in enumerate(jobs)], work, done, self._progress(label))
+        return T
+
+    # ---------- 自动建议：按文件名一遍打分，列表按建议类别分组，可一次全部分类 ----------
+    def cmd_suggest(self):
+        try: m = self.cfg.matcher
+        except re.error as e:
+            self.set_status(f"match 写法有误，无法建议：{e}"); return
+        if not m:
+            self.set_status("配置里没有任何类别写了 match，无法建议"); return
+        with METRICS.span("suggest", files=len(self.files)):
+            sug = m.suggest(self.files)
+        self._suggest = {str(p): r.key for p, r in sug.items()}
+        # 列表按配置里的类别顺序分组，没有建议的排最后
+        order = {r.key: i for i, r in reversed(list(enumerate(self.cfg.rules)))}
+        self.files.reorder(sorted(self.files, key=lambda p: order.get(self._suggest.get(str(p)), len(order))))
         self.refresh_files()
-        self.refresh_status()
-        msg = f"{it['key']}：分类成功 {cnt_ok} 个"
-        if cnt_skip_ext: msg += f"；扩展名不匹配跳过 {cnt_skip_ext} 个"
-        if cnt_skip_missing: msg += f"；源文件不存在移除 {cnt_skip_missing} 个"
-        self.set_status(msg)
-
-    def open_dir_of_selected(self, event=None):
-        sel = self.tree.selection()
-        if not sel: return
-        iid = sel[0]
-        if self.tree.get_children(iid): return   # 组标题行
-        key = self.tree.item(iid, "text")        # 左列“文件类别”
+        self.set_status(f"已为 {len(sug)}/{len(self.files)} 个文件给出建议（{len(set(self._suggest.values()))} 类）")
+
+    def cmd_apply_suggestions(self):
+        if self._ops_busy(): return
+        if not self._suggest: self.cmd_suggest()
         y, m = self.current_ym()
-        it = next((x for x in self.cfg["items"] if x["key"] == key), None)
-        if not it: return
-        d = target_dir(self.cfg, it, y, m)
-        try: d.mkdir(parents=True, exist_ok=True); os.startfile(str(d))
-        except Exception as e: messagebox.showerror("打开失败", str(e))
+        jobs, dirs, keys = [], set(), set()
+        for p in self.files:
+            r = self.cfg.by_key.get(self._suggest.get(str(p)))
+            if r is None or not r.accepts(p): continue
+            d = r.target_dir(y, m); dirs.add(d); keys.add(r.key)
+            jobs.append((p, d / render_name(r, y, m, p)))
+        if not jobs:
+            self.set_status("没有带建议的文件"); return
+        for p, _ in jobs: self._suggest.pop(str(p), None)
+        self._move_batch(f"按建议分类（{len(keys)} 类）", jobs, dirs)
+
+    def _row_text(self, p) -> str:
+        k = self._suggest.get(str(p))
+        return f"{p}    → {k}" if k else str(p)
 
 
 # ---------- IPC：确保单窗口 & “发送到”只追加 ----------
-class _Handler(socketserver.BaseRequestHandler):
+class _Handler(socketserver.StreamRequestHandler):
+    """一行一条 JSON 消息，读到换行（或对方关闭）才算完整；每条回一行应答。"""
     def handle(self):
-        import json as _json
-        try:
-            data = self.request.recv(1024 * 1024)
-            payload = _json.loads(data.decode("utf-8", "ignore"))
-            if payload.get("cmd") == "add":
-                files = payload.get("files", [])
-                app: App = self.server.app_ref
-                app.after(0, app._add_files, files)
-        except Exception as e:
-            logging.exception(f"IPC error: {e}")
+        while True:
+            try:
+                msg = read_msg(self.rfile)
+            except (ValueError, UnicodeDecodeError) as e:
+                logging.exception("IPC error: %s", e)
+                write_msg(self.wfile, {"ok": False, "error": "bad message"}); return
+            except OSError:
+                return
+            if msg is None: return
+            try:
+                write_msg(self.wfile, self.server.dispatch(msg))
+            except OSError:
+                return
 
-class _Server(socketserver.TCPServer):
-    allow_reuse_address = True
-    def __init__(self, addr, handler, app_ref):
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    本机 IPC / 查询接口：每个连接一个线程，一行 JSON 一条命令，回一行 JSON。
+      add       {"files": [...]}                          追加到待办列表（“发送到”用）
+      status    {"ym": "YYYYMM"}                          各类别 齐全/数量：当前年月直接读内存，其他年月走目录缓存
+      classify  {"key", "files", "ym", "wait", "timeout"} 分类（一个可撤销事务）；wait=true 等搬完再回结果
+      undo/redo {}                                        撤销/重做一批
+      metrics   {}                                        计时与计数快照
+    只读命令在连接线程里直接答；要动界面的攒起来，每个 UI 周期只排一次 after，Tk 线程不等网络。
+    """
+    # Windows 上 SO_REUSEADDR 允许第二个进程绑定同一端口，单实例判定会失效
+    allow_reuse_address = not sys.platform.startswith("win")
+    daemon_threads = True
+    request_queue_size = 256   # “发送到”几百个文件时会同时来几百个连接
+    UI_TIMEOUT = 5.0
+
+    def __init__(self, addr, handler):
         super().__init__(addr, handler, bind_and_activate=True)
-        self.app_ref = app_ref
-
-def start_ipc(app: App):
+        self.app_ref = None
+        self._lock = threading.Lock()
+        self._pending: list[str] = []
+        self._calls: list[tuple] = []   # (fn, args, Future)：下个 UI 周期在 Tk 线程执行
+        self._scheduled = False
+
+    def attach(self, app: App):
+        with self._lock:
+            self.app_ref = app
+            self._schedule()
+
+    def dispatch(self, msg) -> dict:
+        if not isinstance(msg, dict): return {"ok": False, "error": "bad message"}
+        cmd = msg.get("cmd")
+        fn = getattr(self, f"_cmd_{cmd}", None) if isinstance(cmd, str) else None
+        if fn is None:
+            return {"ok": False, "error": f"unknown cmd: {cmd}",
+                    "cmds": sorted(k[5:] for k in dir(self) if k.startswith("_cmd_"))}
+        with METRICS.span("ipc", cmd=cmd):
+            try:
+                return fn(msg)
+            except (ValueError, TypeError, KeyError) as e:
+                return {"ok": False, "error": str(e)}
+            except Exception as e:
+                logging.exception("IPC %s failed", cmd)
+                return {"ok": False, "error": str(e)}
+
+    # —— 各命令 ——
+    def _cmd_add(self, msg):
+        files = msg_files(msg)
+        # 一大波“发送到”同时到达：先攒起来，每个 UI 周期只调一次 _add_files
+        with self._lock:
+            self._pending.extend(files)
+            self._schedule()
+        METRICS.add("ipc_files", len(files))
+        return {"ok": True, "queued": len(files)}
+
+    def _cmd_status(self, msg):
+        app = self.app_ref
+        if app is None: return {"ok": False, "error": "starting"}
+        ym = parse_ym(msg.get("ym"))
+        snap = app.snapshot
+        if snap is not None and snap[0] == ym:
+            status, counts, source = snap[1], snap[2], "memory"
+        else:
+            # 不是界面当前年月：在本连接线程里算，目录列表走 ScanCache（mtime 没变 / 另一窗口列过的不再列）
+            status, counts = compute_status_and_count(app.cfg, *ym, DirIndex(app._scan_cache))
+            source = "scan"
+        return {"ok": True, "ym": "%04d%02d" % ym, "source": source,
+                "done": sum(1 for k in counts if status.get(k)), "total": len(counts),
+                "items": {k: {"ok": bool(status.get(k)), "count": n} for k, n in counts.items()}}
+
+    def _cmd_classify(self, msg):
+        key, files = msg_field(msg, "key"), msg_files(msg)
+        ym, timeout = parse_ym(msg.get("ym")), float(msg.get("timeout", 300))   # 先校验完再排队搬移
+        done = Future() if msg.get("wait") else None
+        r = self._ui_call(App.api_classify, key, files, ym, done)
+        if done is None or not r.get("ok"): return r
+        try:
+            return {**r, **done.result(timeout)}
+        except FutureTimeout:
+            return {**r, "ok": False, "error": "timeout (still running)"}
+
+    def _cmd_undo(self, msg):
+        return self._undo_redo(App.cmd_undo, "undo")
+
+    def _cmd_redo(self, msg):
+        return self._undo_redo(App.cmd_redo, "redo")
+
+    def _undo_redo(self, fn, what: str):
+        def call(app):
+            if app.ops.busy: return {"ok": False, "error": "busy"}
+            label = fn(app)
+            return {"ok": True, "label": label} if label else {"ok": False, "error": f"nothing to {what}"}
+        return self._ui_call(call)
+
+    def _cmd_metrics(self, msg):
+        return {"ok": True, "enabled": METRICS.enabled, **METRICS.snapshot(), "last": METRICS.last_ops(10)}
+
+    # —— 交给 UI 线程：本周期到达的 add 与调用合成一次 after ——
+    def _ui_call(self, fn, *args) -> dict:
+        """fn(app, *args) 在 Tk 线程执行，本连接线程等结果（只等，不占 Tk 线程）。"""
+        fut = Future()
+        with self._lock:
+            self._calls.append((fn, args, fut))
+            self._schedule()
+        try:
+            return fut.result(self.UI_TIMEOUT)
+        except FutureTimeout:
+            if fut.cancel():   # 还没轮到执行：撤掉，客户端重试不会做两次
+                return {"ok": False, "error": "ui timeout"}
+            return fut.result()   # 已在 Tk 线程执行中：等它做完再答
+
+    def _schedule(self):
+        if self.app_ref is not None and (self._pending or self._calls) and not self._scheduled:
+            self._scheduled = True
+            self.app_ref.after(50, self._flush)
+
+    def _flush(self):
+        with self._lock:
+            files, self._pending = self._pending, []
+            calls, self._calls = self._calls, []
+            self._scheduled = False
+        app = self.app_ref
+        if files: app._add_files(files)
+        for fn, args, fut in calls:
+            if not fut.set_running_or_notify_cancel(): continue
+            try: fut.set_result(fn(app, *args))
+            except Exception as e:
+                logging.exception("IPC call failed: %s", getattr(fn, "__name__", fn))
+                fut.set_exception(e)
+
+def start_ipc():
     try:
-        srv = _Server((IPC_HOST, IPC_PORT), _Handler, app)
+        srv = _Server((IPC_HOST, IPC_PORT), _Handler)
         t = threading.Thread(target=srv.serve_forever, daemon=True); t.start(); return srv
     except OSError:
         return None
 
 def send_to_existing(files: list[str]) -> bool:
-    import json as _json
+    """True = 已有窗口收下了（或至少有实例占着端口），本进程不要再开窗口。"""
     try:
-        with socket.create_connection((IPC_HOST, IPC_PORT), timeout=0.8) as s:
-            s.sendall(_json.dumps({"cmd": "add", "files": files}).encode("utf-8"))
-        return True
+        reply = ipc_request(IPC_HOST, IPC_PORT, {"cmd": "add", "files": files})
     except OSError:
         return False
+    if not (reply and reply.get("ok")):
+        logging.warning("IPC: no ack from running instance (%s)", reply)
+    return True
 
 
 # ---------- 入口 ----------
 def main():
-    cfg = load_config()
+    setup_logging()
     cli_files = [str(Path(p)) for p in sys.argv[1:] if Path(p).exists()]
 
-    # 若已有实例，直接把文件发过去并退出；否则启动新实例
-    if cli_files and send_to_existing(cli_files):
+    # 若已有实例，直接把文件发过去并退出（模块开头的快速通道已试过就不再试）
+    if cli_files and not _FAST_TRIED and send_to_existing(cli_files):
         return
 
+    # 先占端口再建窗口：同时启动的其他“发送到”进程会连到这里排队，而不是各开一个窗口
+    srv = start_ipc()
+    if srv is None and cli_files:
+        for delay in (0.05, 0.1, 0.2, 0.4, 0.8):
+            time.sleep(delay)
+            if send_to_existing(cli_files): return
+
+    cfg = load_config()
     app = App(cfg, cli_files)
-    srv = start_ipc(app)
+    if srv: srv.attach(app)
 
     def on_close():
         try:
             if srv: srv.shutdown(); srv.server_close()
         except Exception:
             pass
+        app.ops.shutdown()
+        app.journal.close()
+        app._dup_pool.shutdown(wait=False, cancel_futures=True)
+        app.dups.close()
+        app._close_checklist()
+        app.cfg_watcher.stop()
         app.destroy()
 
     app.protocol("WM_DELETE_WINDOW", on_close)
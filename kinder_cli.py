@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Kinder Classify 命令行批处理（无界面，不加载 tkinter / tkinterdnd2）
+用法：
+  python kinder_classify.py --classify "【K&P】生写" --ym 202510 a.pdf b.pdf
+  python kinder_classify.py --manifest ingest.jsonl [--ym 202510]
+  python kinder_classify.py --list
+- manifest：JSON 数组或 JSONL，每项 {"key": 类别, "file": 路径, "ym": "YYYYMM"(可选)}；"-" 表示从 stdin 读
+- 输出：每个文件一行 JSON（i/src/key/status/dst/error），最后一行 {"summary": {...}}
+  status：moved / missing / ext_skip / unknown_key / error / dry_run
+- 同一类别 + 年月为一个撤销事务，与界面共用 kinder_classify.journal.jsonl；日志写 kinder_cli.log
+- 退出码：0 全部成功；1 有文件失败；2 参数或配置错误
+"""
+
+import sys, json, logging, argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from kinder_core import (
+    JOURNAL, LOG, MOVE_WORKERS, setup_logging, load_config, parse_ym, render_name, as_rules, setup_moves,
+    Journal, journaled_move,
+)
+
+
+def read_manifest(path: str) -> list[dict]:
+    text = (sys.stdin.read() if path == "-" else Path(path).read_text(encoding="utf-8")).strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def emit(rec: dict, out=sys.stdout):
+    out.write(json.dumps(rec, ensure_ascii=False) + "\n"); out.flush()
+
+def run(cfg, rows: list[tuple], workers: int = MOVE_WORKERS, dry_run: bool = False,
+        journal_path: Path = JOURNAL, out=None) -> dict:
+    """
+    rows: [(key, src, (y, m)), ...]；按 rows 顺序编号 i，并发搬移，完成一个输出一行（写到 out，默认 stdout）。
+    返回各 status 的计数。
+    """
+    rules = as_rules(cfg).by_key
+    setup_moves(cfg)
+    journal = None if dry_run else Journal(journal_path)
+    txs: dict[tuple, str] = {}
+    summary: dict[str, int] = {}
+
+    def done(rec: dict):
+        summary[rec["status"]] = summary.get(rec["status"], 0) + 1
+        emit(rec, out or sys.stdout)
+
+    def work(i, T, it, src: Path, dst: Path):
+        final = journaled_move(journal, T, i, src, dst, "assign", orig=str(src), dst=str(dst))
+        if final is None:
+            return {"i": i, "src": str(src), "key": it["key"], "status": "missing"}
+        return {"i": i, "src": str(src), "key": it["key"], "status": "moved", "dst": str(final)}
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cli") as pool:
+        futs = {}
+        for i, (key, src, (y, m)) in enumerate(rows):
+            src = Path(src); it = rules.get(key)
+            if it is None:
+                done({"i": i, "src": str(src), "key": key, "status": "unknown_key"}); continue
+            if not it.accepts(src):
+                done({"i": i, "src": str(src), "key": key, "status": "ext_skip"}); continue
+            dst = it.target_dir(y, m) / render_name(it, y, m, src)
+            if dry_run:
+                done({"i": i, "src": str(src), "key": key, "status": "dry_run", "dst": str(dst)}); continue
+            if (key, y, m) not in txs:
+                txs[(key, y, m)] = journal.begin(key)
+            futs[pool.submit(work, i, txs[(key, y, m)], it, src, dst)] = (i, src, key)
+        for f in as_completed(futs):
+            i, src, key = futs[f]
+            try:
+                done(f.result())
+            except Exception as e:
+                logging.exception("cli move error: %s", src)
+                done({"i": i, "src": str(src), "key": key, "status": "error", "error": str(e)})
+
+    if journal:
+        for T in txs.values(): journal.commit(T)
+        journal.close()
+    return summary
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="kinder_classify", description="Kinder Classify 命令行批处理")
+    g = ap.add_mutually_exclusive_group(required=True)
+    g.add_argument("--classify", metavar="KEY", help="把 files 全部归入该类别")
+    g.add_argument("--manifest", metavar="PATH", help="JSON/JSONL 清单（- 为 stdin）")
+    g.add_argument("--list", action="store_true", help="列出所有类别 key")
+    ap.add_argument("--ym", help="操作年月 YYYYMM，默认当月；manifest 里每项可用 ym 覆盖")
+    ap.add_argument("--workers", type=int, default=MOVE_WORKERS, help="并发搬移线程数")
+    ap.add_argument("--dry-run", action="store_true", help="只输出目标路径，不搬移")
+    ap.add_argument("files", nargs="*")
+    a = ap.parse_args(argv)
+    setup_logging(LOG.with_name("kinder_cli.log"))
+
+    try:
+        cfg = load_config()
+        if a.list:
+            for r in cfg.rules: emit({"key": r.key})
+            return 0
+        ym = parse_ym(a.ym)
+        if a.classify:
+            rows = [(a.classify, f, ym) for f in a.files]
+        else:
+            rows = [(r["key"], r["file"], parse_ym(r["ym"]) if r.get("ym") else ym) for r in read_manifest(a.manifest)]
+    except (OSError, ValueError, KeyError) as e:
+        emit({"error": str(e)}); return 2
+
+    summary = run(cfg, rows, max(1, a.workers), a.dry_run)
+    emit({"summary": summary})
+    bad = sum(v for k, v in summary.items() if k not in ("moved", "dry_run"))
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
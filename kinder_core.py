@@ -0,0 +1,1568 @@
+# -*- coding: utf-8 -*-
+"""
+Kinder Classify 核心（不依赖 tkinter）
+- 配置定位 / 日志 / 路径与命名规则
+- 目录索引（DirIndex）与目录监视（DirWatcher）、目录列表缓存（ScanCache，可落盘两进程共用）、年度总览（iter_year_matrix）
+- 冲突改名分配（SuffixAllocator）、搬移、撤销/重做日志（Journal）
+主程序 kinder_classify.py、清单 checklist_viewer.pyw、命令行批处理 kinder_cli.py 共用。
+"""
+
+import os, re, json, fnmatch, shutil, hashlib, sqlite3, socket, logging, logging.handlers, threading, time, uuid, queue, atexit
+from bisect import bisect_left, insort
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque
+from collections.abc import Mapping
+from functools import lru_cache
+from pathlib import Path
+from datetime import datetime
+
+# ---------- 配置与日志 ----------
+SCRIPT_DIR = Path(__file__).resolve().parent
+CANDIDATES = [
+    SCRIPT_DIR,
+    Path(r"E:/ShangJin_Kindergarten/KinderClassify"),
+    Path(r"E:\ShangJin_Kindergarten\KinderClassify"),
+]
+CONFIG = None; LOG = None
+for base in CANDIDATES:
+    cfg = base / "config.json"
+    if cfg.exists():
+        CONFIG = cfg; LOG = base / "kinder_classify.log"; break
+if CONFIG is None:
+    CONFIG = SCRIPT_DIR / "config.json"
+    LOG = SCRIPT_DIR / "kinder_classify.log"
+
+# ---------- 日志：调用方只往队列里放一条记录，后台线程成批写盘（一批只 flush 一次）、按大小轮转 ----------
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+class _LogFormatter(logging.Formatter):
+    """普通记录照旧一行文字；带 extra={"event": {...}} 的记录（搬移等）写成一行 JSON，便于审计时直接解析。"""
+    def format(self, r):
+        ev = getattr(r, "event", None)
+        if ev is not None:
+            return json.dumps({"ts": self.formatTime(r), "level": r.levelname, **ev}, ensure_ascii=False)
+        return super().format(r)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        return record   # 同进程队列：格式化（含 f-string 以外的 % 参数、traceback）都留给写线程
+
+class _LogWriter(threading.Thread):
+    BATCH = 1000
+    ROLL_RETRY_S = 60   # 轮转失败（文件被别的程序开着）后隔多久再试，免得每批都关了又开
+
+    def __init__(self, q: queue.Queue, path: Path):
+        super().__init__(daemon=True, name="log-writer")
+        self.q = q
+        self.h = logging.handlers.RotatingFileHandler(
+            str(path), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True)
+        self.h.setFormatter(_LogFormatter("%(asctime)s [%(levelname)s] %(message)s"))
+        self._roll_after = 0.0
+
+    def run(self):
+        while True:
+            batch = [self.q.get()]
+            try:
+                while len(batch) < self.BATCH: batch.append(self.q.get_nowait())
+            except queue.Empty:
+                pass
+            lines = []
+            for r in batch:
+                if r is None: continue
+                try: lines.append(self.h.format(r) + "\n")
+                except Exception: pass
+            if lines: self._write("".join(lines))
+            if None in batch: return
+
+    def _write(self, text: str):
+        h = self.h
+        try:
+            if h.stream is None: h.stream = h._open()
+            if h.maxBytes and h.stream.tell() + len(text) > h.maxBytes and time.monotonic() >= self._roll_after:
+                try: h.doRollover()
+                except OSError:   # 文件被别的程序（编辑器等）开着：过一阵再试
+                    self._roll_after = time.monotonic() + self.ROLL_RETRY_S
+                if h.stream is None: h.stream = h._open()
+            h.stream.write(text); h.stream.flush()
+        except Exception:
+            pass   # 日志写不了不能影响搬移
+
+    def stop(self):
+        self.q.put(None); self.join(timeout=2)
+
+_LOG_WRITER = None
+
+def setup_logging(path: Path = LOG) -> _LogWriter:
+    """
+    由各程序入口调用（导入本模块不碰日志）：主程序写 kinder_classify.log，清单、命令行各写自己的文件，
+    不会有两个进程同时轮转同一个文件。同一进程只配置一次。
+    """
+    global _LOG_WRITER
+    if _LOG_WRITER is not None: return _LOG_WRITER
+    q = queue.Queue()
+    root = logging.getLogger()
+    root.handlers[:] = [_QueueHandler(q)]
+    root.setLevel(logging.INFO)
+    w = _LogWriter(q, path); w.start()
+    atexit.register(w.stop)
+    _LOG_WRITER = w
+    return w
+
+def log_event(ev: str, level: int = logging.INFO, **fields):
+    """结构化事件（JSON 行）：log_event("move", src=..., dst=..., bytes=..., ms=..., same_device=...)。"""
+    logging.log(level, ev, extra={"event": {"ev": ev, **fields}})
+
+# 撤销/重做日志：与 log 同目录，关窗/崩溃后仍可撤销
+JOURNAL = LOG.with_name("kinder_classify.journal.jsonl")
+
+# 后台搬移线程数（跨盘搬大文件时并发）
+MOVE_WORKERS = 4
+# 年度总览并发列目录的线程数（SMB 上每次 scandir 主要耗在网络往返）
+OVERVIEW_WORKERS = 16
+
+# Checklist Viewer 的本地端口：主程序搬完文件后把变化推过去
+VIEWER_ADDR = ("127.0.0.1", 53452)
+
+
+# ---------- 计时与计数（可选：config "metrics": true 或环境变量 KINDER_METRICS=1） ----------
+class _Span:
+    __slots__ = ("m", "name", "detail", "t0", "parts")
+    def __init__(self, m, name, detail):
+        self.m, self.name, self.detail, self.parts = m, name, detail, {}
+    def __enter__(self):
+        self.m._stack().append(self); self.t0 = time.perf_counter(); return self
+    def __exit__(self, *exc):
+        self.m._finish(self, (time.perf_counter() - self.t0) * 1000)
+
+class _NullSpan:
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): pass
+_NULL_SPAN = _NullSpan()
+
+class Metrics:
+    """
+    计时片段（span）+ 计数器。关闭时 span() 返回共享的空上下文、add() 立即返回，几乎零开销。
+    - 每个名字保留最近 WINDOW 次耗时，snapshot() 给出 n / p50 / p95 / max 与按 2 的幂分桶的直方图
+    - span 可嵌套（按线程）：子片段的次数与耗时汇总到外层，最外层结束时记为“最近一次操作”的分解
+    """
+    WINDOW = 512
+    BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)   # 毫秒上界，最后一桶为更慢
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+        self.counters: dict[str, int] = {}
+        self._lat: dict[str, deque] = {}
+        self.last: dict[str, dict] = {}   # 最外层 span 名 → 最近一次的分解
+        self._reporter = None
+
+    def span(self, name: str, **detail):
+        return _Span(self, name, detail) if self.enabled else _NULL_SPAN
+
+    def add(self, name: str, n: int = 1):
+        if not self.enabled: return
+        with self._lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def _stack(self) -> list:
+        st = getattr(self._tls, "stack", None)
+        if st is None: st = self._tls.stack = []
+        return st
+
+    def _finish(self, sp: _Span, ms: float):
+        st = self._stack(); st.pop()
+        with self._lock:
+            self._lat.setdefault(sp.name, deque(maxlen=self.WINDOW)).append(ms)
+            if st:
+                n, t = st[-1].parts.get(sp.name, (0, 0.0))
+                st[-1].parts[sp.name] = (n + 1, t + ms)
+            else:
+                self.last[sp.name] = {"name": sp.name, "ms": round(ms, 2), "at": time.time(), **sp.detail,
+                                      "parts": {k: [n, round(t, 2)] for k, (n, t) in sp.parts.items()}}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lat = {k: sorted(v) for k, v in self._lat.items()}
+            out = {"counters": dict(self.counters), "spans": {}}
+        for k, xs in lat.items():
+            hist = [0] * (len(self.BUCKETS) + 1)
+            for x in xs: hist[bisect_left(self.BUCKETS, x)] += 1
+            out["spans"][k] = {"n": len(xs), "p50": round(xs[len(xs) // 2], 2),
+                               "p95": round(xs[min(len(xs) - 1, int(len(xs) * 0.95))], 2),
+                               "max": round(xs[-1], 2), "hist": hist}
+        return out
+
+    def last_ops(self, n: int = 4) -> list[dict]:
+        with self._lock: return sorted(self.last.values(), key=lambda r: r["at"], reverse=True)[:n]
+
+    def describe(self) -> str:
+        """给状态栏提示用的多行文字：最近几次操作的分解 + 计数 + 各片段 p50/p95。"""
+        lines = []
+        for r in self.last_ops():
+            parts = "，".join(f"{k}×{n} {t:.1f}ms" for k, (n, t) in r["parts"].items())
+            lines.append(f"{time.strftime('%H:%M:%S', time.localtime(r['at']))} {r['name']} {r['ms']:.1f}ms"
+                         + (f"（{parts}）" if parts else ""))
+        snap = self.snapshot()
+        if snap["counters"]:
+            lines.append("计数：" + "  ".join(f"{k}={v}" for k, v in sorted(snap["counters"].items())))
+        for k, v in sorted(snap["spans"].items()):
+            lines.append(f"{k}: n={v['n']} p50={v['p50']}ms p95={v['p95']}ms max={v['max']}ms")
+        return "\n".join(lines) or "暂无数据"
+
+    def enable(self, interval: float = 60.0):
+        """打开计时，并每 interval 秒往日志写一行 METRICS {json}。"""
+        self.enabled = True
+        if self._reporter is None and interval > 0:
+            def loop():
+                while True:
+                    time.sleep(interval)
+                    logging.info("METRICS " + json.dumps(self.snapshot(), ensure_ascii=False))
+            self._reporter = threading.Thread(target=loop, daemon=True, name="metrics"); self._reporter.start()
+
+METRICS = Metrics()
+
+def setup_metrics(cfg) -> Metrics:
+    if cfg.get("metrics") or os.environ.get("KINDER_METRICS") == "1":
+        METRICS.enable(float(cfg.get("metrics_interval", 60)))
+    return METRICS
+
+
+# ---------- 通用工具 ----------
+def load_config(path: Path = None, reuse: "RuleTable" = None) -> "RuleTable":
+    """
+    读 config.json，校验后编译成规则表（仍可像 dict 一样 cfg["items"] / cfg.get(...) 读原始配置）。
+    reuse：上一版规则表，没变的类别沿用原 Rule 对象（连同它的路径/前缀缓存）。
+    """
+    with open(path or CONFIG, "r", encoding="utf-8") as f:
+        return RuleTable(validate_config(json.load(f)), reuse)
+
+def validate_config(raw) -> dict:
+    """检查会让程序跑到一半才出错的配置：缺字段、类型不对、模板占位符写错。有问题抛 ValueError。"""
+    if not isinstance(raw, dict) or not isinstance(raw.get("items"), list):
+        raise ValueError("配置应为对象，且含 items 列表")
+    rules = []
+    for n, it in enumerate(raw["items"], 1):
+        where = f"items 第 {n} 项"
+        if not isinstance(it, dict) or not isinstance(it.get("key"), str) or not it["key"]:
+            raise ValueError(f"{where}：缺少 key")
+        where = f"{where}（{it['key']}）"
+        if not isinstance(it.get("rename"), str):
+            raise ValueError(f"{where}：缺少 rename")
+        if "exts" in it and not (isinstance(it["exts"], list) and all(isinstance(e, str) for e in it["exts"])):
+            raise ValueError(f"{where}：exts 应为字符串列表")
+        if not (it.get("path_template") or raw.get("default_path_template") or raw.get("out_root")):
+            raise ValueError(f"{where}：没有 path_template，全局也没有 default_path_template / out_root")
+        try:
+            r = Rule(raw, it)
+            r.target_dir(2000, 1); r.prefix(2000, 1); render_name(it, 2000, 1, Path("x.pdf"))
+        except (KeyError, IndexError, ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"{where}：模板或规则有误（{e!r}）") from None
+        if it.get("match"):
+            try: Matcher([r])
+            except (re.error, TypeError, AttributeError) as e:
+                raise ValueError(f"{where}：match 写法有误（{e}）") from None
+        rules.append(r)
+    # 运行时所有类别合成一个正则：整体再编译一次，逐项没问题、合起来出错的也在这里拦下
+    try: Matcher(rules)
+    except re.error as e:
+        raise ValueError(f"match 合并后有误（{e}）") from None
+    return raw
+
+def now_ym():
+    n = datetime.now(); return n.year, n.month
+
+def parse_ym(s: str):
+    """"YYYYMM" / "YYYY-MM" → (年, 月)；空则当月。"""
+    if not s: return now_ym()
+    s = str(s).replace("-", "")
+    if len(s) != 6 or not s.isdigit() or not 1 <= int(s[4:]) <= 12:
+        raise ValueError(f"年月应为 YYYYMM：{s}")
+    return int(s[:4]), int(s[4:])
+
+def fmt_ym(y, m):
+    return f"{y:04d}", f"{m:02d}", f"{y:04d}{m:02d}"
+
+def safe_name(s: str) -> str:
+    for c in '<>:"/\\|?*': s = s.replace(c, "_")
+    return s.rstrip(" .")
+
+def render_name(it, y: int, m: int, src: Path) -> str:
+    """按类别的 rename 模板生成新文件名。"""
+    YYYY, MM, YYYYMM = fmt_ym(y, m)
+    return it["rename"].format(
+        key=it["key"], YYYY=YYYY, MM=MM, YYYYMM=YYYYMM,
+        DD=f"{datetime.now().day:02d}",
+        orig="_"+safe_name(src.stem), ext=src.suffix
+    )
+
+class SuffixAllocator:
+    """
+    冲突改名的分配器：每个目录只列一次，内存里记住每个 (stem, sep, ext) 已用的最大序号，
+    之后分配 name-N 是 O(1)，不再逐个 exists() 探测。
+    缓存只作提示：总是先用独占创建（O_EXCL）试原名 dst，占不到才按缓存序号分配；
+    文件搬走时 forget() 从缓存里去掉，序号随之回落（撤销/重做来回不会越加越多后缀）。
+    多开实例/多线程同时分配也不会撞名；撞了就 +1 重试。
+    占位到搬完（settle）之间记在 pending 里：跨盘复制可能要好一会儿，这期间计数不把 0 字节占位当成已有文件。
+    """
+    _SUFFIX_RE = re.compile(r"^(.*?)(-undo|-)(\d+)$")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dirs: dict[str, tuple[set, dict]] = {}
+        self._pending: dict[str, set[str]] = {}   # 目录（normcase）→ 还是占位的文件名
+
+    def _seed(self, d: Path):
+        d.mkdir(parents=True, exist_ok=True)
+        names, top = set(), {}
+        for n in scan_names(d):
+            n = os.path.normcase(n); names.add(n)
+            stem, ext = os.path.splitext(n)
+            mt = self._SUFFIX_RE.match(stem)
+            if mt:
+                k = (mt[1], mt[2], ext)
+                top[k] = max(top.get(k, 0), int(mt[3]))
+        return names, top
+
+    def claim(self, dst: Path, sep: str = "-") -> Path:
+        """返回一个已被占位（0 字节文件）的空闲路径：dst 本身或 stem{sep}N{ext}。"""
+        stem, ext = os.path.splitext(dst.name)
+        key = (os.path.normcase(stem), sep, os.path.normcase(ext))
+        with self._lock:
+            for attempt in (1, 2):
+                if str(dst.parent) not in self._dirs:
+                    self._dirs[str(dst.parent)] = self._seed(dst.parent)
+                names, top = self._dirs[str(dst.parent)]
+                t = dst
+                try:
+                    while True:
+                        if t is None:
+                            top[key] = top.get(key, 0) + 1
+                            t = dst.with_name(f"{stem}{sep}{top[key]}{ext}")
+                        names.add(os.path.normcase(t.name))
+                        try:
+                            os.close(os.open(t, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                            self._pending.setdefault(os.path.normcase(str(t.parent)), set()).add(t.name)
+                            return t
+                        except FileExistsError:
+                            t = None   # 被别的实例抢先，序号 +1 再试
+                except FileNotFoundError:
+                    # 目录在缓存后被删掉了：重新列一次
+                    self._dirs.pop(str(dst.parent), None)
+                    if attempt == 2: raise
+
+    def settle(self, t: Path):
+        """t 的占位已被真文件替换（或已删掉）。"""
+        d = os.path.normcase(str(t.parent))
+        with self._lock:
+            names = self._pending.get(d)
+            if names is None: return
+            names.discard(t.name)
+            if not names: del self._pending[d]
+
+    def pending(self, d) -> set[str]:
+        """目录 d 里本进程占了位、还没搬完的文件名。"""
+        if not self._pending: return set()
+        with self._lock: return set(self._pending.get(os.path.normcase(str(d)), ()))
+
+    def forget(self, p: Path):
+        """p 已离开其目录（搬走 / 删掉）：从缓存去掉；若它是最大序号，序号回落到仍占用的那个。"""
+        with self._lock:
+            hit = self._dirs.get(str(p.parent))
+            if hit is None: return
+            names, top = hit
+            n = os.path.normcase(p.name); names.discard(n)
+            stem, ext = os.path.splitext(n)
+            mt = self._SUFFIX_RE.match(stem)
+            if not mt: return
+            k = (mt[1], mt[2], ext); i = int(mt[3])
+            if top.get(k) != i: return
+            while i > 0 and f"{k[0]}{k[1]}{i}{ext}" not in names: i -= 1
+            if i: top[k] = i
+            else: top.pop(k, None)
+
+_ALLOC = SuffixAllocator()
+
+# 跨盘搬移的校验方式："size"（默认，复制走系统加速）或 "hash"（边复制边算 SHA-256，落盘后再读一遍比对）
+MOVE_VERIFY = "size"
+COPY_BUFSIZE = 8 * 1024 * 1024
+
+def setup_moves(cfg):
+    global MOVE_VERIFY
+    MOVE_VERIFY = "hash" if cfg.get("verify") == "hash" else "size"
+
+def _sha256_file(p: Path) -> str:
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for b in iter(lambda: f.read(COPY_BUFSIZE), b""): h.update(b)
+    return h.hexdigest()
+
+def _copy_verify(src: Path, t: Path, size: int):
+    """
+    跨盘：复制到 t → fsync → 校验大小（或哈希）→ 才删源文件。
+    任何一步失败都抛异常、源文件保留；中途崩溃时 t 只是半截副本，Journal 启动恢复会删掉它。
+    """
+    if MOVE_VERIFY == "hash":
+        h = hashlib.sha256()
+        with open(src, "rb") as fi, open(t, "wb") as fo:
+            for b in iter(lambda: fi.read(COPY_BUFSIZE), b""):
+                h.update(b); fo.write(b)
+            fo.flush(); os.fsync(fo.fileno())
+        if _sha256_file(t) != h.hexdigest():
+            raise OSError(f"复制校验失败（哈希不一致）：{src} -> {t}")
+    else:
+        shutil.copyfile(src, t)   # 系统加速（sendfile / fcopyfile / 大缓冲）
+        with open(t, "rb+") as fo: os.fsync(fo.fileno())
+    got = os.path.getsize(t)
+    if size is not None and got != size:
+        raise OSError(f"复制校验失败（大小 {got} != {size}）：{src} -> {t}")
+    try: shutil.copystat(src, t)
+    except OSError: pass
+    os.remove(src)
+
+def _move_onto(src: Path, t: Path, phase: str = "assign", tx: str = None) -> Path:
+    """
+    把 src 搬到已占位的 t：同一设备直接 os.replace（原子覆盖占位）；
+    跨设备（U 盘 / 下载目录 → 归档盘）走 _copy_verify：大缓冲复制、fsync、校验后才删源。
+    多个文件由调用方的线程池并发搬，一个文件读盘时另一个在写盘。
+    每次搬移记一条 move 事件（JSON 行：src/dst/bytes/ms/same_device）。
+    """
+    t0 = time.perf_counter()
+    with METRICS.span("move"):
+        try:
+            st = os.stat(src); size = st.st_size
+            same = st.st_dev == os.stat(t.parent).st_dev
+        except OSError:
+            size, same = None, True   # 让 os.replace 报出真正的错误
+        METRICS.add("stat", 2)
+        try:
+            if same:
+                try: os.replace(src, t)
+                except OSError:
+                    if not src.exists(): raise
+                    same = False   # 同卷也可能 rename 不了（挂载点 / 网络映射），退回复制
+            if not same:
+                _copy_verify(src, t, size)
+        except Exception:
+            try: os.remove(t)   # 失败时清掉占位 / 半截副本（源文件仍在）
+            except OSError: pass
+            _ALLOC.forget(t)
+            raise
+        finally:
+            _ALLOC.settle(t)
+        _ALLOC.forget(src)
+        METRICS.add("move_rename" if same else "move_copy"); METRICS.add("bytes_moved", size or 0)
+    log_event("move", phase=phase, tx=tx, src=str(src), dst=str(t), bytes=size,
+              ms=round((time.perf_counter() - t0) * 1000, 2), same_device=same)
+    return t
+
+def move_with_conflict(src: Path, dst: Path) -> Path:
+    return _move_onto(src, _ALLOC.claim(dst))
+
+# ---------- 撤销/重做日志（JSONL，追加写，崩溃可恢复） ----------
+_OPEN_JOURNALS: dict[str, set] = {}   # 本进程里开着的日志 → 已占槽位（POSIX 字节锁按进程算，同进程要自己记）
+
+class _JournalLock:
+    """
+    主程序与命令行可能同时开着同一个日志：用锁文件 <journal>.lock 的字节锁协调，进程退出由系统释放。
+    - 第 0 字节：追加锁，每写一行持有一下（Windows 上两个进程同时追加会互相覆盖）
+    - 第 1..SLOTS 字节：每个开着的 Journal 占一个；能把全部占下 = 没有别人开着，才可以恢复 / 压缩
+    """
+    SLOTS = 32
+
+    def __init__(self, path: Path):
+        self._f = open(path, "a+b")
+        self.slot = None
+
+    def _try(self, off: int) -> bool:
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._f.seek(off); msvcrt.locking(self._f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.lockf(self._f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, off)
+            return True
+        except OSError:
+            return False
+
+    def _release(self, off: int):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._f.seek(off); msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.lockf(self._f.fileno(), fcntl.LOCK_UN, 1, off)
+        except OSError:
+            pass
+
+    def open_exclusive(self) -> bool:
+        """试着占下全部槽位；成功返回 True（之后 settle() 只留一个），否则一个都不占、返回 False。"""
+        got = []
+        for off in range(1, self.SLOTS + 1):
+            if not self._try(off): break
+            got.append(off)
+        else:
+            self.slot = 1; return True
+        for off in got: self._release(off)
+        return False
+
+    def settle(self):
+        """独占期结束（恢复 / 压缩做完）：只留自己的槽位，让别的进程进来。"""
+        for off in range(2, self.SLOTS + 1): self._release(off)
+
+    def open_shared(self, taken=(), timeout: float = 10.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for off in range(1, self.SLOTS + 1):
+                if off not in taken and self._try(off):
+                    self.slot = off; return
+            time.sleep(0.05)
+        logging.warning("journal lock: no free slot, continuing without one")
+
+    def append_lock(self):
+        while not self._try(0): time.sleep(0.005)
+
+    def append_unlock(self):
+        self._release(0)
+
+    def release_slot(self):
+        """关闭日志时放掉槽位；锁文件句柄留着，关窗后还在搬完的后台任务追加时仍要用追加锁。"""
+        if self.slot is not None: self._release(self.slot); self.slot = None
+
+class Journal:
+    """
+    持久化的撤销/重做操作日志。一次 assign = 一个事务（tx），撤销/重做按事务整批进行。
+    - 每个文件：先记 claim（src 与占到的目标名），搬完再记 move/undo/redo；
+      启动时发现只有 claim 的记录，按磁盘现状补记（已搬完）或删掉目标处的半截文件（回滚）。
+    - 没 commit 的事务：已搬完的部分补 commit，其余视为未发生。
+    - 撤销/重做栈完全由记录重放得出；运行时与启动时走同一个 _apply()。
+    - 别的进程（主程序 / 命令行）也开着同一个日志时：只重放、只追加，不恢复、不补 commit、不压缩，
+      别人进行中的事务与占位原样不动；追加时持进程间锁。
+    
+    entry["state"]：dst=在目标处，orig=已撤销回原处，gone=文件不见了或重做链已被新分类截断
+    """
+    KEEP = 100   # 最多保留多少个可撤销的事务
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.txs: dict[str, dict] = {}
+        self.undo_stack: list[str] = []
+        self.redo_stack: list[str] = []
+        self._pending: dict[tuple, dict] = {}   # (tx, i) → 尚未完成的 claim
+        self.recovered = 0
+        self._f = None
+        self._plock = _JournalLock(self.path.with_suffix(".lock"))
+        self._key = key = os.path.normcase(str(Path(self.path).resolve()))
+        taken = _OPEN_JOURNALS.setdefault(key, set())
+        self.exclusive = not taken and self._plock.open_exclusive()
+        if not self.exclusive: self._plock.open_shared(taken)
+        if self._plock.slot is not None: taken.add(self._plock.slot)
+        try:
+            self._load()
+        finally:
+            if self.exclusive: self._plock.settle()
+        self._f = open(self.path, "a", encoding="utf-8")
+
+    # —— 读取 / 恢复 / 压缩 ——
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try: self._apply(json.loads(line))
+                    except (ValueError, KeyError): pass   # 崩溃时写了半行：忽略
+        except FileNotFoundError:
+            return
+        if not self.exclusive:
+            logging.info("JOURNAL: shared with another process, append-only (no recovery / compaction)")
+            return
+        for (T, i), c in list(self._pending.items()):
+            if "target" not in c:   # 只记了意图：占位可能已建好，删掉
+                self.recovered += self._sweep_placeholders(c)
+                self._pending.pop((T, i), None); continue
+            src, tgt = Path(c["src"]), Path(c["target"])
+            try:
+                if tgt.exists() and not src.exists():     # 已搬完只是没来得及记：补记
+                    self._apply({**c, "op": {"assign": "move"}.get(c["phase"], c["phase"]), "current": str(tgt)})
+                    self.recovered += 1
+                elif tgt.exists():                         # 没搬完：删掉占位 / 半截副本，源文件还在
+                    tgt.unlink(); self.recovered += 1
+            except OSError:
+                logging.exception("journal recover failed: %s", c)
+            self._pending.pop((T, i), None)
+        for T, tx in list(self.txs.items()):
+            if tx["open"]: self._apply({"op": "commit", "tx": T})
+        if self.recovered:
+            logging.info("JOURNAL: recovered %d unfinished file operations", self.recovered)
+        self._compact()
+
+    @staticmethod
+    def _sweep_placeholders(c: dict) -> int:
+        """want 或 want{sep}N、0 字节、在意图记录之后建的文件：是没来得及记下的占位。"""
+        want = Path(c["want"]); stem, ext = os.path.splitext(want.name)
+        pat = re.compile(re.escape(stem) + "(?:" + re.escape(c["sep"]) + r"\d+)?" + re.escape(ext) + "$", re.I)
+        n = 0
+        try:
+            with os.scandir(want.parent) as it:
+                for e in it:
+                    if not pat.match(e.name) or not e.is_file(): continue
+                    st = e.stat()
+                    if st.st_size == 0 and st.st_mtime >= c.get("ts", 0) - 2:
+                        os.remove(e.path); n += 1
+        except OSError:
+            logging.exception("journal recover failed: %s", c)
+        return n
+
+    def _compact(self):
+        live = [T for T in self.txs if T in self.undo_stack or T in self.redo_stack]
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for T in live:
+                tx = self.txs[T]
+                ents = [{**e, "i": i} for i, e in tx["entries"].items()]
+                f.write(json.dumps({"op": "tx", "tx": T, "label": tx["label"], "entries": ents}, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"op": "stacks", "undo": self.undo_stack, "redo": self.redo_stack}) + "\n")
+            f.flush(); os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.txs = {T: self.txs[T] for T in live}
+
+    # —— 记录重放 ——
+    def _restack(self, T: str, to: list = None):
+        states = {e["state"] for e in self.txs[T]["entries"].values()}
+        if T in self.undo_stack and "dst" not in states: self.undo_stack.remove(T)
+        if T in self.redo_stack and "orig" not in states: self.redo_stack.remove(T)
+        if to is not None:
+            if T in to: to.remove(T)
+            to.append(T)
+
+    def _apply(self, r: dict):
+        op, T = r["op"], r.get("tx")
+        if op == "begin":
+            self.txs[T] = {"label": r.get("label", ""), "entries": {}, "open": True}
+        elif op == "tx":
+            self.txs[T] = {"label": r["label"], "entries": {e.pop("i"): e for e in r["entries"]}, "open": False}
+        elif op == "stacks":
+            self.undo_stack = [T for T in r["undo"] if T in self.txs]
+            self.redo_stack = [T for T in r["redo"] if T in self.txs]
+        elif op == "claim":
+            self._pending[(T, r["i"])] = r
+        elif T in self.txs:
+            tx = self.txs[T]
+            self._pending.pop((T, r.get("i")), None)
+            if op == "move":
+                tx["entries"][r["i"]] = {"orig": r["orig"], "dst": r["dst"], "current": r["current"], "state": "dst"}
+            elif op == "commit":
+                tx["open"] = False
+                if not tx["entries"]:
+                    del self.txs[T]; return
+                # 新的分类截断重做链
+                for R in self.redo_stack:
+                    for e in self.txs[R]["entries"].values():
+                        if e["state"] == "orig": e["state"] = "gone"
+                self.redo_stack.clear()
+                self.undo_stack.append(T)
+                while len(self.undo_stack) > self.KEEP:
+                    self.txs.pop(self.undo_stack.pop(0), None)
+            elif op in ("undo", "redo"):
+                e = tx["entries"][r["i"]]
+                e["current"], e["state"] = r["current"], ("orig" if op == "undo" else "dst")
+                self._restack(T, self.redo_stack if op == "undo" else self.undo_stack)
+            elif op == "drop":
+                tx["entries"][r["i"]]["state"] = "gone"
+                self._restack(T)
+
+    def write(self, r: dict):
+        with self._lock:
+            self._apply(r)
+            if self._f is None:   # 关窗后仍在搬完的后台任务
+                self._f = open(self.path, "a", encoding="utf-8")
+            self._plock.append_lock()
+            try:
+                self._f.seek(0, os.SEEK_END)
+                self._f.write(json.dumps(r, ensure_ascii=False) + "\n"); self._f.flush()
+            finally:
+                self._plock.append_unlock()
+
+    def sync(self):
+        with self._lock:
+            if self._f: os.fsync(self._f.fileno())
+
+    # —— 供界面/批处理使用 ——
+    def begin(self, label: str) -> str:
+        T = uuid.uuid4().hex[:12]
+        self.write({"op": "begin", "tx": T, "label": label, "ts": datetime.now().isoformat(timespec="seconds")})
+        return T
+
+    def commit(self, T: str):
+        self.write({"op": "commit", "tx": T}); self.sync()
+
+    def peek(self, stack: str):
+        """stack="undo"/"redo"：返回 (tx, label, [(i, entry), ...]) 或 None。"""
+        with self._lock:
+            st = self.undo_stack if stack == "undo" else self.redo_stack
+            if not st: return None
+            T = st[-1]; want = "dst" if stack == "undo" else "orig"
+            tx = self.txs[T]
+            return T, tx["label"], [(i, dict(e)) for i, e in tx["entries"].items() if e["state"] == want]
+
+    def close(self):
+        with self._lock:
+            if self._f: self.sync(); self._f.close(); self._f = None
+            if self._plock.slot is not None:
+                _OPEN_JOURNALS[self._key].discard(self._plock.slot)
+                self._plock.release_slot()
+
+def journaled_move(j: Journal, T: str, i: int, frm: Path, to: Path, phase: str, **info):
+    """
+    phase="assign"/"undo"/"redo"：占名 → 记 claim → 搬 → 记结果。
+    info 随记录写入（assign 时为 orig/dst）。源文件不存在返回 None（撤销/重做时同时把该条标为失效）。
+    """
+    if not frm.exists():
+        if phase != "assign": j.write({"op": "drop", "tx": T, "i": i})
+        return None
+    sep = "-undo" if phase == "undo" else "-"
+    # 先记意图再占位：两步之间崩溃，恢复时按 want/sep 找回并删掉那个 0 字节占位
+    rec = {"op": "claim", "tx": T, "i": i, "phase": phase, "src": str(frm), "want": str(to), "sep": sep,
+           "ts": time.time(), **info}
+    j.write(rec)
+    t = _ALLOC.claim(to, sep=sep)
+    j.write({**rec, "target": str(t)})
+    final = _move_onto(frm, t, phase, T)
+    j.write({"op": {"assign": "move"}.get(phase, phase), "tx": T, "i": i, "current": str(final), **info})
+    return final
+
+# ---------- 规则编译：每个类别一个不可变 Rule，(年, 月) → 路径/前缀走 LRU 缓存 ----------
+class Rule:
+    """
+    一个类别编译后的规则。模板在构造时预先解析，扩展名为小写 frozenset；
+    也可以当作原始 item 只读使用（rule["key"] / rule.get("rename")）。
+    """
+    __slots__ = ("key", "group", "item", "exts", "_tpl", "_legacy_root", "_sub", "_sub_append",
+                 "_prefix_tpl", "_need", "sig")
+
+    @staticmethod
+    def signature(cfg: dict, it: dict) -> str:
+        """决定这条规则行为的全部输入；相同则编译结果相同，可直接沿用。"""
+        return json.dumps([it, cfg.get("default_path_template"), cfg.get("out_root")],
+                          ensure_ascii=False, sort_keys=True)
+
+    def __init__(self, cfg: dict, it: dict):
+        init = lambda k, v: object.__setattr__(self, k, v)
+        init("key", it["key"]); init("group", group_of(it["key"])); init("item", it)
+        init("sig", Rule.signature(cfg, it))
+        init("exts", frozenset(e.lower() for e in it["exts"]) if it.get("exts") else None)
+
+        # 路径模板：item 覆盖全局；都没有走老规则 out_root/{YYYYMM}_Unclassified
+        tpl = it.get("path_template") or cfg.get("default_path_template") or None
+        init("_tpl", tpl)
+        init("_legacy_root", None if tpl else cfg["out_root"])
+        sub = it.get("dest_subdir", "")
+        init("_sub", sub)
+        # 模板里没写 {dest_subdir}，但配置给了 sub，则在末尾追加
+        init("_sub_append", bool(sub and tpl and "{dest_subdir}" not in tpl))
+
+        # 期望前缀：rename 截到第一个 {orig}/{DD}/{ext} 之前
+        ren = it["rename"]; cut = len(ren)
+        for token in ("{orig}", "{DD}", "{ext}"):
+            i = ren.find(token)
+            if i != -1 and i < cut: cut = i
+        init("_prefix_tpl", ren[:cut])
+
+        rule = it.get("present_rule", {"mode": "any"})
+        init("_need", int(rule.get("n", 1)) if rule.get("mode") == "count_at_least" else 1)
+
+    def __setattr__(self, k, v):
+        raise AttributeError("Rule is immutable")
+
+    def __getitem__(self, k): return self.item[k]
+    def get(self, k, default=None): return self.item.get(k, default)
+    def __repr__(self): return f"Rule({self.key!r})"
+
+    def target_dir(self, y: int, m: int) -> Path: return _rule_dir(self, y, m)
+    def prefix(self, y: int, m: int) -> str: return _rule_prefix(self, y, m)
+    def present(self, cnt: int) -> bool: return cnt >= self._need
+    def accepts(self, path) -> bool:
+        return not self.exts or os.path.splitext(str(path))[1].lower() in self.exts
+
+@lru_cache(maxsize=4096)
+def _rule_dir(rule: Rule, y: int, m: int) -> Path:
+    YYYY, MM, YYYYMM = fmt_ym(y, m)
+    if rule._legacy_root is not None:
+        return Path(rule._legacy_root) / f"{YYYYMM}_Unclassified"
+    # 先把 dest_subdir 自己也做一次占位符替换，再套模板（支持模板中直接写 {dest_subdir}）
+    sub = rule._sub.format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM) if rule._sub else ""
+    base = Path(rule._tpl.format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM, dest_subdir=sub))
+    return base / sub if rule._sub_append else base
+
+@lru_cache(maxsize=4096)
+def _rule_prefix(rule: Rule, y: int, m: int) -> str:
+    YYYY, MM, YYYYMM = fmt_ym(y, m)
+    return (rule._prefix_tpl.replace("{YYYYMM}", YYYYMM).replace("{YYYY}", YYYY)
+            .replace("{MM}", MM).replace("{key}", rule.key))
+
+class RuleTable(Mapping):
+    """
+    编译后的规则表：rules（按配置顺序）、by_key（key → Rule，重复 key 取第一个）。
+    作为 Mapping 时就是原始配置 dict，旧代码 cfg["items"] / cfg.get(...) 照常可用。
+    reuse：旧表；签名相同的类别直接沿用旧 Rule，只有改过的规则重新编译、缓存重新计算。
+    """
+    def __init__(self, cfg: dict, reuse: "RuleTable" = None):
+        self.cfg = cfg
+        old = {r.sig: r for r in reuse.rules} if reuse else {}
+        self.rules = tuple(old.get(Rule.signature(cfg, it)) or Rule(cfg, it) for it in cfg["items"])
+        self.by_key: dict[str, Rule] = {}
+        for r in self.rules: self.by_key.setdefault(r.key, r)
+
+    def __getitem__(self, k): return self.cfg[k]
+    def __iter__(self): return iter(self.cfg)
+    def __len__(self): return len(self.cfg)
+
+    def rule_of(self, it) -> Rule:
+        if isinstance(it, Rule): return it
+        r = self.by_key.get(it["key"])
+        return r if r is not None and (r.item is it or r.item == it) else Rule(self.cfg, it)
+
+    def dirs(self, y: int, m: int) -> set[Path]:
+        """该年月下所有类别的不同目标目录。"""
+        return {r.target_dir(y, m) for r in self.rules}
+
+    @property
+    def exts(self) -> frozenset:
+        """所有类别允许的扩展名之并；有任一类别不限扩展名则为 None（拖入文件夹时不过滤）。"""
+        if any(not r.exts for r in self.rules): return None
+        return frozenset().union(*(r.exts for r in self.rules))
+
+    @property
+    def matcher(self) -> "Matcher":
+        """自动建议用的合成正则；第一次用到时编译，一张规则表只编译一次。"""
+        if getattr(self, "_matcher", None) is None: self._matcher = Matcher(self.rules)
+        return self._matcher
+
+    def root_hint(self, y: int, m: int) -> str:
+        YYYY, MM, YYYYMM = fmt_ym(y, m)
+        if self.cfg.get("default_path_template"):
+            return self.cfg["default_path_template"].format(YYYY=YYYY, MM=MM, YYYYMM=YYYYMM)
+        return f"{self.cfg.get('out_root', '')}/{YYYYMM}_Unclassified"
+
+def diff_rules(old: RuleTable, new: RuleTable):
+    """两版规则表的差异：(新增 key, 删除 key, 改动 key)，各为 set。"""
+    a, b = old.by_key, new.by_key
+    added, removed = b.keys() - a.keys(), a.keys() - b.keys()
+    changed = {k for k in a.keys() & b.keys() if a[k] is not b[k]}
+    return added, removed, changed
+
+class ConfigWatcher:
+    """
+    每 interval 秒 stat 一次配置文件；mtime/大小变了就在本线程里读取 + 校验 + 编译（沿用没变的 Rule），
+    成功回调 on_reload(新表)，失败回调 on_error(异常) 且继续用旧规则。回调都在监视线程里，UI 需 after(0, ...)。
+    """
+    def __init__(self, table: RuleTable, on_reload, on_error, path: Path = None, interval: float = 1.0):
+        self.table, self.on_reload, self.on_error = table, on_reload, on_error
+        self.path, self.interval = Path(path or CONFIG), interval
+        self._sig = self._stat()
+        self._stop = threading.Event()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _stat(self):
+        try: st = os.stat(self.path); return st.st_mtime_ns, st.st_size
+        except OSError: return None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            sig = self._stat()
+            if sig is None or sig == self._sig: continue
+            time.sleep(0.2)   # 编辑器常分两次写入，稍等再读
+            if self._stat() != sig: continue
+            self._sig = sig
+            try:
+                new = load_config(self.path, reuse=self.table)
+            except Exception as e:
+                logging.warning("CONFIG RELOAD FAILED: %s", e)
+                try: self.on_error(e)
+                except Exception: logging.exception("config error callback")
+                continue
+            self.table = new
+            try: self.on_reload(new)
+            except Exception: logging.exception("config reload callback")
+
+    def stop(self):
+        self._stop.set()
+
+# ---------- 自动建议：各类别的 match（glob / regex / keywords）合成一个正则，一遍给所有文件打分 ----------
+def _as_list(v) -> list:
+    return [] if not v else [v] if isinstance(v, str) else list(v)
+
+class Matcher:
+    """
+    item["match"] = {"glob": [...], "regex": [...], "keywords": [...]}，也可直接写关键字列表。
+    先按扩展名剔掉收不了这个文件的类别，剩下的所有模式合成正则（按扩展名各编译一次，忽略大小写）：
+    - glob 要整个文件名命中：各 glob 包成 (?=(...)|)（不中也照样往下），在开头 match 一次就知道哪些命中，得 1000 + 文件名长度；
+    - keywords 合成一个不带组名的 (?=(...|...)) 逐个位置扫（长的在前），命中的字再查表得知是哪条；
+    - regex 同样逐个位置扫，但要带组名（所以 regex 里不能有自己的捕获组，也不能匹配空串，见 _plain）。
+    位置之间互不遮挡；每个模式只算第一次命中的字符数。各模式的分计入所属类别，分最高者为建议，同分取配置里靠前的。
+    """
+    GLOB_BONUS = 1000
+
+    def __init__(self, rules):
+        self.entries = []   # (序号, Rule, [glob 正则], [regex], [keywords])
+        for n, r in enumerate(rules):
+            spec = r.get("match")
+            if not spec: continue
+            if not isinstance(spec, dict): spec = {"keywords": spec}
+            globs = [fnmatch.translate(g) for g in _as_list(spec.get("glob"))]
+            regs = [self._plain(x) for x in _as_list(spec.get("regex"))]
+            kws = [k for k in _as_list(spec.get("keywords")) if k]
+            if globs or regs or kws: self.entries.append((n, r, globs, regs, kws))
+        self._by_ext: dict[str, tuple] = {}
+        self._compile(self.entries)   # 全部模式先编译一次：写法有误在加载配置时就报
+
+    @staticmethod
+    def _compile(entries) -> tuple:
+        """→ (glob 正则, glob 组名, regex 正则, keywords 正则, 关键字 → 组名, 组名 → (Rule, 序号))"""
+        globs, regs, kws, owner = [], [], {}, {}
+        for n, r, gs, rs, ks in entries:
+            for j, pat in enumerate(gs):
+                name = f"_g{n}_{j}"; owner[name] = (r, n)
+                globs.append(f"(?=(?P<{name}>{pat})|)")
+            for j, pat in enumerate(rs):
+                name = f"_r{n}_{j}"; owner[name] = (r, n)
+                regs.append((-len(pat), n, f"(?P<{name}>{pat})"))
+            for j, k in enumerate(ks):
+                name = f"_k{n}_{j}"; owner[name] = (r, n)
+                kws.setdefault(k.lower(), name)   # 几类写了同一个关键字：算给靠前的
+        regs.sort(key=lambda w: w[:2])
+        grx = re.compile("".join(globs), re.IGNORECASE) if globs else None
+        rrx = re.compile("(?=" + "|".join(w[2] for w in regs) + ")", re.IGNORECASE) if regs else None
+        krx = re.compile("(?=(" + "|".join(re.escape(k) for k in sorted(kws, key=len, reverse=True)) + "))",
+                         re.IGNORECASE) if kws else None
+        return grx, [g for g in owner if g.startswith("_g")], rrx, krx, kws, owner
+
+    @staticmethod
+    def _plain(x: str) -> str:
+        """用户 regex 会被包进命名组再合并：不能自带捕获组 / 反向引用（要分组请用 (?:...)），也不能匹配空串。"""
+        if re.compile(x).groups:
+            raise re.error(f"regex 不能含捕获组或反向引用，请改用 (?:...)：{x}")
+        if re.fullmatch(x, ""):
+            raise re.error(f"regex 不能匹配空串：{x}")
+        return x
+
+    def __bool__(self): return bool(self.entries)
+
+    def _for(self, name: str) -> tuple:
+        ext = os.path.splitext(name)[1].lower()
+        got = self._by_ext.get(ext)
+        if got is None:
+            got = self._by_ext[ext] = self._compile([e for e in self.entries if e[1].accepts(name)])
+        return got
+
+    def suggest_one(self, path):
+        if not self.entries: return None
+        name = os.path.basename(str(path))
+        grx, gnames, rrx, krx, kws, owner = self._for(name)
+        hits: dict[str, int] = {}   # 组名 → 分
+        if grx is not None:
+            mt = grx.match(name)
+            hits.update((g, self.GLOB_BONUS + len(name)) for g in gnames if mt.group(g) is not None)
+        if rrx is not None:
+            for mt in rrx.finditer(name):
+                g = mt.lastgroup
+                if g not in hits and mt.group(g): hits[g] = len(mt.group(g))
+        if krx is not None:
+            for mt in krx.finditer(name):
+                g = kws.get(mt.group(1).lower())
+                if g and g not in hits: hits[g] = len(mt.group(1))
+        scores: dict[str, list] = {}
+        for g, pts in hits.items():
+            r, n = owner[g]
+            sc = scores.setdefault(r.key, [0, -n, r])
+            sc[0] += pts
+        return max(scores.values(), key=lambda sc: sc[:2])[2] if scores else None
+
+    def suggest(self, paths) -> dict:
+        """{路径: Rule}：只含有建议的文件。"""
+        out = {}
+        for p in paths:
+            r = self.suggest_one(p)
+            if r is not None: out[p] = r
+        return out
+
+def as_rules(cfg) -> RuleTable:
+    return cfg if isinstance(cfg, RuleTable) else RuleTable(cfg)
+
+def _rule(cfg, it) -> Rule:
+    return it if isinstance(it, Rule) else as_rules(cfg).rule_of(it)
+
+# ---------- 目录索引：一次刷新内每个目录只列一次 ----------
+def scan_names(d: Path) -> list[str]:
+    """os.scandir 列出目录下的文件名（已排序）；目录不存在返回空列表。"""
+    with METRICS.span("scan"):
+        try:
+            with os.scandir(d) as it:
+                names = [e.name for e in it if e.is_file()]   # DirEntry 自带类型信息，免逐个 stat
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+        names.sort()
+        METRICS.add("scandir"); METRICS.add("files_scanned", len(names))
+        return names
+
+# ---------- 拖入 / “发送到”的路径：文件原样收下，文件夹递归列出（生成器，边列边交） ----------
+def walk_files(root, exts=None, stop=None):
+    """
+    os.scandir 深度优先列出 root 下所有文件（每个目录先交文件、再进子目录，按名排序）。
+    exts：只要这些扩展名（小写，含点）；stop：threading.Event，置位即停。
+    不跟随目录符号链接；无权限 / 已消失的目录记日志跳过。
+    """
+    stack = [str(root)]
+    while stack:
+        if stop is not None and stop.is_set(): return
+        d = stack.pop()
+        files, subdirs = [], []
+        try:
+            with os.scandir(d) as it:
+                for e in it:
+                    try:
+                        if e.is_dir(follow_symlinks=False): subdirs.append(e.path)
+                        elif e.is_file() and (not exts or os.path.splitext(e.name)[1].lower() in exts):
+                            files.append(e.path)
+                    except OSError:
+                        continue
+        except OSError as e:
+            logging.warning("walk: skip %s (%s)", d, e); continue
+        METRICS.add("scandir"); METRICS.add("files_scanned", len(files))
+        files.sort(); subdirs.sort(reverse=True)
+        yield from files
+        stack.extend(subdirs)
+
+def iter_input_files(paths, exts=None, stop=None):
+    """用户给的路径：文件直接交出（不按扩展名过滤，分类时再判断），文件夹交给 walk_files，不存在的跳过。"""
+    for p in paths:
+        if stop is not None and stop.is_set(): return
+        p = os.path.normpath(os.path.expandvars(str(p)))
+        if os.path.isdir(p): yield from walk_files(p, exts, stop)
+        elif os.path.isfile(p): yield p
+
+class DirIndex:
+    """
+    刷新期间共享的目录快照：多个类别落在同一目录时只 scandir 一次，
+    计数用排好序的文件名 + bisect 做前缀区间查找。
+    """
+    def __init__(self, cache: "ScanCache" = None):
+        self._names: dict[str, list[str]] = {}
+        self.cache = cache   # 给了就先按 mtime 查缓存（含另一个进程刚列过的），没变的目录不再列
+
+    def names(self, d: Path) -> list[str]:
+        k = str(d)
+        if k not in self._names:
+            # 缓存里的列表是共用的，这里要增量改，复制一份
+            self._names[k] = list(self.cache.names(k)) if self.cache else scan_names(d)
+        return self._names[k]
+
+    # —— 监视模式下按事件增量维护（未列过的目录不用管，下次用到时再列） ——
+    def add(self, d, name: str):
+        names = self._names.get(str(d))
+        if names is not None:
+            i = bisect_left(names, name)
+            if i == len(names) or names[i] != name: insort(names, name)
+
+    def discard(self, d, name: str):
+        names = self._names.get(str(d))
+        if names is not None:
+            i = bisect_left(names, name)
+            if i < len(names) and names[i] == name: del names[i]
+
+    def invalidate(self, d):
+        self._names.pop(str(d), None)
+
+    def count(self, d: Path, prefix: str, exts=None) -> int:
+        return count_names(settled_names(d, self.names(d)), prefix, exts)
+
+def settled_names(d, names: list[str]) -> list[str]:
+    """去掉本进程还在往里搬（跨盘复制中，只是 0 字节占位）的文件名；没有就原样返回。"""
+    busy = _ALLOC.pending(d)
+    return [n for n in names if n not in busy] if busy else names
+
+def count_names(names: list[str], prefix: str, exts=None) -> int:
+    """已排序文件名里以 prefix 开头（且扩展名在 exts 内）的个数。"""
+    lo = bisect_left(names, prefix)
+    hi = bisect_left(names, prefix + "\U0010ffff", lo) if prefix else len(names)
+    if not exts:
+        return hi - lo
+    return sum(1 for n in names[lo:hi] if os.path.splitext(n)[1].lower() in exts)
+
+# ---------- 目录监视（watchdog 可用则用原生通知；不可用则 mtime 轮询）：第一次打开监视才加载 watchdog ----------
+_WATCHDOG = None
+
+def _watchdog():
+    """(Observer, 事件处理类)；没装 watchdog 返回 None。"""
+    global _WATCHDOG
+    if _WATCHDOG is None:
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except Exception:
+            _WATCHDOG = False
+        else:
+            class _WatchHandler(FileSystemEventHandler):
+                def __init__(self, watcher):
+                    self.w = watcher
+                def on_created(self, e):
+                    if not e.is_directory: self.w._note_path(e.src_path, "add")
+                def on_deleted(self, e):
+                    self.w._note_path(e.src_path, "del")
+                def on_moved(self, e):
+                    self.w._note_path(e.src_path, "del")
+                    if not e.is_directory: self.w._note_path(e.dest_path, "add")
+            _WATCHDOG = (Observer, _WatchHandler)
+    return _WATCHDOG or None
+
+class DirWatcher:
+    """
+    监视一组目录，把变化去抖后整批回调：on_change({dir: [(op, name), ...] 或 None})。
+    - watchdog 可用且目录存在：原生事件，op 为 "add"/"del"，可增量维护计数；
+    - 否则每 interval 秒 stat 一次目录 mtime，变了就给 None（表示该目录需重列）。
+    - 一次批量拷贝的事件在 debounce 秒内静默后才回调一次。
+    on_change 在监视线程里调用，UI 侧需自行 after(0, ...) 切回主线程。
+    """
+    def __init__(self, on_change, interval: float = 2.0, debounce: float = 0.5):
+        self.on_change = on_change
+        self.interval, self.debounce = interval, debounce
+        self._lock = threading.Lock()
+        self._dirs: set[str] = set()
+        self._mtimes: dict[str, int] = {}
+        self._pending: dict[str, list] = {}
+        self._last_event = 0.0
+        self._observer = None
+        self._obs_lock = threading.Lock()
+        self._native: set[str] = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _mtime(d: str):
+        METRICS.add("stat")
+        try: return os.stat(d).st_mtime_ns
+        except OSError: return None
+
+    def set_dirs(self, dirs):
+        dirs = {str(d) for d in dirs}
+        with self._lock:
+            if dirs == self._dirs: return
+            self._dirs = dirs
+            self._pending.clear()
+            self._mtimes = {d: self._mtime(d) for d in dirs}
+        self._restart_observer()
+
+    def _restart_observer(self):
+        wd = _watchdog()
+        if not wd: return
+        Observer, _WatchHandler = wd
+        with self._obs_lock:
+            if self._observer:
+                self._observer.stop(); self._observer = None
+            native = set()
+            obs = Observer(); h = _WatchHandler(self)
+            for d in list(self._dirs):
+                if os.path.isdir(d):
+                    try: obs.schedule(h, d, recursive=False); native.add(d)
+                    except Exception: logging.exception("watch failed: %s", d)
+            obs.daemon = True; obs.start()
+            self._observer, self._native = obs, native
+
+    def _note_path(self, path: str, op: str):
+        d, name = os.path.split(path)
+        with self._lock:
+            if d not in self._dirs: return
+            ops = self._pending.setdefault(d, [])
+            if ops is not None: ops.append((op, name))
+            self._last_event = time.monotonic()
+
+    def _poll(self):
+        now = time.monotonic()
+        for d in list(self._dirs):
+            if d in self._native: continue
+            mt = self._mtime(d)
+            with self._lock:
+                if d in self._mtimes and mt != self._mtimes[d]:
+                    self._mtimes[d] = mt
+                    self._pending[d] = None   # 只知道“变了”，需要重列
+                    self._last_event = now
+        # 之前不存在、现在出现的目录：改为原生监视
+        if _watchdog() and any(d not in self._native and os.path.isdir(d) for d in self._dirs):
+            self._restart_observer()
+
+    def _loop(self):
+        last_poll = 0.0
+        while not self._stop.wait(0.2):
+            now = time.monotonic()
+            if now - last_poll >= self.interval:
+                self._poll(); last_poll = now
+            with self._lock:
+                if not self._pending or now - self._last_event < self.debounce: continue
+                batch, self._pending = self._pending, {}
+            try: self.on_change(batch)
+            except Exception: logging.exception("watch callback error")
+
+    def stop(self):
+        self._stop.set()
+        if self._observer: self._observer.stop()
+
+def apply_changes(index: DirIndex, changes: dict):
+    """把 DirWatcher 的变化应用到目录索引上。"""
+    for d, ops in changes.items():
+        if ops is None:
+            index.invalidate(d); continue
+        for op, name in ops:
+            (index.add if op == "add" else index.discard)(d, name)
+
+def count_for_item(cfg, it, y: int, m: int, index: DirIndex = None) -> int:
+    r = _rule(cfg, it)
+    return (index or DirIndex()).count(r.target_dir(y, m), r.prefix(y, m), r.exts)
+
+def compute_status_and_count(cfg, y: int, m: int, index: DirIndex = None):
+    """一次扫描同时得到 状态 与 数量：({key: bool}, {key: int})。"""
+    index = index or DirIndex()
+    status, counts = {}, {}
+    for r in as_rules(cfg).rules:
+        cnt = index.count(r.target_dir(y, m), r.prefix(y, m), r.exts)
+        status[r.key] = r.present(cnt)
+        counts[r.key] = cnt
+    return status, counts
+
+def compute_status(cfg, y: int, m: int, index: DirIndex = None) -> dict:
+    return compute_status_and_count(cfg, y, m, index)[0]
+
+# ---------- 重复文件：目标目录的内容指纹（大小 → 头尾部分哈希 → 全文哈希），SQLite 持久化 ----------
+FINGERPRINTS = LOG.with_name("kinder_classify.fingerprints.sqlite")
+HASH_WORKERS = 4
+
+class Duplicate:
+    """搬移结果：内容与目标目录里已有的 existing 相同（skip 模式下没有搬）。"""
+    __slots__ = ("src", "existing")
+    def __init__(self, src: Path, existing: Path):
+        self.src, self.existing = src, existing
+
+class DupIndex:
+    """
+    每个目标目录的文件指纹，按 (目录, 文件名) 存 size / mtime / 部分哈希 / 全文哈希。
+    - 先比大小：大小没有撞上的来件一个字节都不读，归档里的文件也不读
+    - 大小相同才算部分哈希（头尾各 64KB），部分哈希相同才算全文哈希
+    - 哈希按 (路径, 大小, mtime) 缓存：文件没变就不再读，只有新文件 / 改过的文件要算
+    """
+    PART = 64 * 1024
+
+    def __init__(self, path: Path = FINGERPRINTS):
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS fp (dir TEXT, name TEXT, size INTEGER, mtime INTEGER,"
+                            " part TEXT, full TEXT, PRIMARY KEY (dir, name))")
+            self.db.commit()
+
+    @classmethod
+    def hash_of(cls, p: Path, size: int, kind: str) -> str:
+        h = hashlib.sha256()
+        with open(p, "rb") as f:
+            if kind == "part" and size > 2 * cls.PART:
+                h.update(str(size).encode()); h.update(f.read(cls.PART))
+                f.seek(-cls.PART, os.SEEK_END); h.update(f.read(cls.PART))
+            else:   # 小文件的“部分哈希”就是全文哈希
+                for b in iter(lambda: f.read(COPY_BUFSIZE), b""): h.update(b)
+        return h.hexdigest()
+
+    def sync_dir(self, d) -> dict[str, tuple[int, int]]:
+        """列目录（带 size / mtime），与库里的记录对齐：消失的删掉，变了的清空哈希。"""
+        k, cur = str(d), {}
+        try:
+            with os.scandir(k) as it:
+                for e in it:
+                    if e.is_file():
+                        st = e.stat(); cur[e.name] = (st.st_size, st.st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        with self._lock:
+            old = {n: (s, m) for n, s, m in self.db.execute("SELECT name, size, mtime FROM fp WHERE dir=?", (k,))}
+            gone = [(k, n) for n in old if old[n] != cur.get(n)]
+            new = [(k, n, s, m) for n, (s, m) in cur.items() if old.get(n) != (s, m)]
+            if gone or new:
+                self.db.executemany("DELETE FROM fp WHERE dir=? AND name=?", gone)
+                self.db.executemany("INSERT INTO fp (dir, name, size, mtime) VALUES (?, ?, ?, ?)", new)
+                self.db.commit()
+        return cur
+
+    def stored_hash(self, d, name: str, size: int, kind: str):
+        k = str(d)
+        with self._lock:
+            row = self.db.execute(f"SELECT {kind} FROM fp WHERE dir=? AND name=?", (k, name)).fetchone()
+        if row and row[0]: return row[0]
+        try: h = self.hash_of(Path(k) / name, size, kind)
+        except OSError: return None
+        with self._lock:
+            self.db.execute(f"UPDATE fp SET {kind}=? WHERE dir=? AND name=?", (h, k, name)); self.db.commit()
+        return h
+
+    def checker(self, dirs) -> "DupChecker":
+        return DupChecker(self, dirs)
+
+    def close(self):
+        with self._lock: self.db.close()
+
+class DupChecker:
+    """一批来件对一组目标目录查重；目录在第一次用到时才同步（一批只同步一次），可在多个线程里同时 match。"""
+    def __init__(self, index: DupIndex, dirs):
+        self.index, self.dirs = index, [str(d) for d in dirs]
+        self._lock = threading.Lock()
+        self._by_size: dict[int, list[tuple[str, str]]] = None
+
+    def _sizes(self):
+        with self._lock:
+            if self._by_size is None:
+                by_size = {}
+                for d in self.dirs:
+                    for name, (size, _) in self.index.sync_dir(d).items():
+                        by_size.setdefault(size, []).append((d, name))
+                self._by_size = by_size
+            return self._by_size
+
+    def match(self, src: Path):
+        """src 的内容在目标目录里已有则返回那个文件的路径，否则 None。"""
+        try: size = os.path.getsize(src)
+        except OSError: return None
+        cands = self._sizes().get(size)
+        if not cands: return None
+        try: sp = DupIndex.hash_of(src, size, "part")
+        except OSError: return None
+        sf = None
+        for d, name in list(cands):
+            if self.index.stored_hash(d, name, size, "part") != sp: continue
+            if size <= 2 * DupIndex.PART: return Path(d) / name
+            if sf is None:
+                try: sf = DupIndex.hash_of(src, size, "full")
+                except OSError: return None
+            if self.index.stored_hash(d, name, size, "full") == sf: return Path(d) / name
+        return None
+
+    def note(self, p: Path):
+        """本批刚搬进去的文件也算进去（同一批里重复两次的也能认出来）。"""
+        try: size = os.path.getsize(p)
+        except OSError: return
+        with self._lock:
+            if self._by_size is not None:
+                self._by_size.setdefault(size, []).append((str(p.parent), p.name))
+
+    def find(self, srcs) -> dict[Path, Path]:
+        """并发查一批：{来件: 已有文件}。"""
+        srcs = list(srcs)
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash") as pool:
+            return {s: ex for s, ex in zip(srcs, pool.map(self.match, srcs)) if ex is not None}
+
+# ---------- 目录列表缓存：按目录 mtime 失效；可落盘（SQLite WAL），主程序与清单两个进程共用 ----------
+SCAN_CACHE = LOG.with_name("kinder_classify.scancache.sqlite")
+SCAN_RACY_NS = 2_000_000_000   # FAT / 部分 SMB 的 mtime 精度是 2 秒：列目录时 mtime 还在这个窗口内的结果不作数
+
+class SharedScanCache:
+    """
+    落盘的目录列表：目录 → (mtime_ns, 列目录时刻, 文件名)，放在 config.json 旁边。
+    WAL 模式，多个进程同时读写安全；被锁太久 / 只读盘等写不进去只记日志，不影响扫描结果。
+    """
+    def __init__(self, path: Path = SCAN_CACHE):
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), timeout=2.0, check_same_thread=False)
+        with self._lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS dirs (dir TEXT PRIMARY KEY, mtime INTEGER,"
+                            " scanned INTEGER, names TEXT)")
+            self.db.commit()
+
+    @classmethod
+    def open(cls, path: Path = SCAN_CACHE) -> "SharedScanCache":
+        """打不开（权限、文件损坏）返回 None，调用方只用内存缓存。"""
+        try: return cls(path)
+        except (sqlite3.Error, OSError) as e:
+            logging.warning("shared scan cache disabled: %s", e); return None
+
+    def get(self, d: str, mtime: int):
+        """(列目录时刻, 文件名)；没有或 mtime 对不上返回 None。"""
+        try:
+            with self._lock:
+                row = self.db.execute("SELECT scanned, names FROM dirs WHERE dir=? AND mtime=?", (d, mtime)).fetchone()
+        except sqlite3.Error as e:
+            logging.warning("scan cache read failed: %s", e); return None
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, d: str, mtime: int, scanned: int, names: list[str]):
+        try:
+            with self._lock:
+                self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                                (d, mtime, scanned, json.dumps(names, ensure_ascii=False)))
+                self.db.commit()
+        except sqlite3.Error as e:
+            logging.warning("scan cache write failed: %s", e)
+
+    def close(self):
+        with self._lock: self.db.close()
+
+class ScanCache:
+    """
+    目录 → (mtime_ns, 列目录时刻, 已排序文件名)。目录 mtime 没变就直接用上次的列表，只花一次 stat；
+    先取 mtime 再列目录，列的过程中有变化下次 mtime 对不上会重列；mtime 离列目录时刻不到 SCAN_RACY_NS 的不算命中。
+    shared（SharedScanCache）：内存没命中先查它，自己列完写回它，另一个进程就不用再列。线程安全。
+    列的时候还在窗口内的（刚搬进文件的目录），过了窗口后台再列一次写回，两边下一次刷新都能直接用。
+    """
+    def __init__(self, shared: SharedScanCache = None):
+        self._lock = threading.Lock()
+        self._d: dict[str, tuple[int, int, list[str]]] = {}
+        self.shared = shared
+        self._later: dict[str, threading.Timer] = {}   # 目录 → 过了窗口再列一次的定时器（每个目录最多一个）
+        self._closed = False
+
+    def names(self, d) -> list[str]:
+        """返回的列表是共用的，调用方不要改。"""
+        k = str(d); METRICS.add("stat")
+        try: mt = os.stat(k).st_mtime_ns
+        except OSError:
+            with self._lock: self._d.pop(k, None)
+            return []
+        with self._lock: hit = self._d.get(k)
+        if hit and hit[0] == mt and hit[1] - mt >= SCAN_RACY_NS:
+            return hit[2]
+        got = self.shared.get(k, mt) if self.shared is not None else None
+        if got and got[0] - mt >= SCAN_RACY_NS:
+            METRICS.add("scan_cache_shared")
+            with self._lock: self._d[k] = (mt, *got)
+            return got[1]
+        scanned = time.time_ns()
+        names = scan_names(Path(k))
+        self._store(k, mt, scanned, names, relist=True)
+        return names
+
+    def _store(self, k: str, mt: int, scanned: int, names: list[str], relist: bool):
+        with self._lock:
+            if self._closed: return
+            self._d[k] = (mt, scanned, names)
+            if relist and scanned - mt < SCAN_RACY_NS and k not in self._later:
+                wait = min(mt + SCAN_RACY_NS - scanned, SCAN_RACY_NS) / 1e9 + 0.1   # mtime 在将来（时钟不准）也只等一个窗口
+                t = self._later[k] = threading.Timer(wait, self._relist, (k, mt))
+                t.daemon = True; t.start()
+            shared = self.shared
+        if shared is not None: shared.put(k, mt, scanned, names)
+
+    def _relist(self, k: str, mt: int):
+        """定时器线程：目录没再变就重列并写回；又变了就算了，下次谁用到谁列。只重列一次，不再排。"""
+        with self._lock:
+            self._later.pop(k, None)
+            if self._closed: return
+        try:
+            if os.stat(k).st_mtime_ns != mt: return
+        except OSError:
+            return
+        METRICS.add("scan_relist")
+        self._store(k, mt, time.time_ns(), scan_names(Path(k)), relist=False)
+
+    def cached(self, d) -> bool:
+        with self._lock: return str(d) in self._d
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for t in self._later.values(): t.cancel()
+            self._later.clear()
+            shared, self.shared = self.shared, None
+        if shared is not None: shared.close()
+
+# ---------- 年度总览：12 个月的目标目录并发列出，目录列表走 ScanCache ----------
+def year_plan(cfg, y: int) -> dict[Path, list[tuple[int, Rule]]]:
+    """{目标目录: [(月, 规则), ...]}：一年里每个不同目录只列一次。"""
+    plan: dict[Path, list] = {}
+    for m in range(1, 13):
+        for r in as_rules(cfg).rules:
+            plan.setdefault(r.target_dir(y, m), []).append((m, r))
+    return plan
+
+def iter_year_matrix(cfg, y: int, cache: ScanCache, workers: int = OVERVIEW_WORKERS, stop=None):
+    """
+    并发列出 y 年所有目标目录，每列完一个目录产出一批格子 [(key, 月, 数量, 是否齐全), ...]。
+    stop（threading.Event）被置位后不再产出，未开始的目录直接放弃。
+    """
+    plan = year_plan(cfg, y)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="overview") as pool:
+        futs = {pool.submit(cache.names, d): d for d in plan}
+        try:
+            for f in as_completed(futs):
+                if stop is not None and stop.is_set(): break
+                try: names = settled_names(futs[f], f.result())
+                except Exception:
+                    logging.exception("overview scan failed: %s", futs[f]); names = []
+                cells = []
+                for m, r in plan[futs[f]]:
+                    cnt = count_names(names, r.prefix(y, m), r.exts)
+                    cells.append((r.key, m, cnt, r.present(cnt)))
+                yield cells
+        finally:
+            for f in futs: f.cancel()
+
+def group_of(k: str) -> str:
+    l, r = k.find("【"), k.find("】")
+    return k[l+1:r].strip() if (l != -1 and r != -1 and r > l) else "其他"
+
+def grouped_items(items):
+    groups, order = {}, []
+    for it in items:
+        g = group_of(it["key"])
+        if g not in groups:
+            groups[g] = []; order.append(g)
+        groups[g].append(it)
+    return order, groups
+
+
+# ---------- 本地 IPC：一行一条 JSON（UTF-8，以换行结束） ----------
+def read_msg(rfile):
+    """从 socket.makefile("rb") 读一条消息；读到换行或连接关闭为止。连接已关返回 None。"""
+    line = rfile.readline()
+    if not line.strip():
+        return None
+    return json.loads(line.decode("utf-8"))
+
+def msg_field(msg: dict, field: str, typ=str):
+    """消息里的必填字段：缺了抛 ValueError("missing field: …")，类型不对抛 TypeError。"""
+    if field not in msg: raise ValueError(f"missing field: {field}")
+    v = msg[field]
+    if not isinstance(v, typ): raise TypeError(f"{field} 类型不对：{type(v).__name__}")
+    return v
+
+def msg_files(msg: dict, field: str = "files") -> list[str]:
+    """消息里的文件 / 目录列表：可省略（当空列表），给了就得是字符串列表。"""
+    files = msg.get(field) or []
+    if not (isinstance(files, list) and all(isinstance(f, str) for f in files)):
+        raise TypeError(f"{field} 应为字符串列表")
+    return files
+
+def write_msg(wfile, msg: dict):
+    wfile.write(json.dumps(msg, ensure_ascii=False).encode("utf-8") + b"\n")
+    wfile.flush()
+
+def ipc_request(host: str, port: int, msg: dict, connect_timeout: float = 0.8, reply_timeout: float = 5.0):
+    """
+    发一条消息并等一行应答。连不上抛 OSError；
+    对方收下但没有应答（旧版本 / 超时）返回 None。
+    """
+    with socket.create_connection((host, port), timeout=connect_timeout) as s:
+        s.settimeout(reply_timeout)
+        with s.makefile("rwb") as f:
+            write_msg(f, msg)
+            try:
+                return read_msg(f)
+            except (OSError, ValueError):
+                return None
+
+def notify_viewer(msg: dict):
+    """把变化推给 Checklist Viewer（若开着）。后台线程发送，不阻塞界面；没开就算了。"""
+    def _send():
+        try: ipc_request(*VIEWER_ADDR, msg, connect_timeout=0.3, reply_timeout=1.0)
+        except OSError: pass
+    threading.Thread(target=_send, daemon=True).start()
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+年度总览：类别 × 12 个月的状态矩阵（主程序与 Checklist Viewer 共用）
+- 一年内所有不同的目标目录在后台线程池里并发列出，列完一个目录就填一批格子
+- 目录列表按 mtime 缓存在调用方传入的 ScanCache 里，再次打开 / 刷新时未变的目录不再重列
+- 双击格子打开该类别在该月的目录
+"""
+
+import os, queue, threading, time
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from kinder_core import ScanCache, as_rules, grouped_items, iter_year_matrix, year_plan
+
+MONTHS = [f"{m:02d}" for m in range(1, 13)]
+
+class YearOverview(tk.Toplevel):
+    def __init__(self, master, cfg, cache: ScanCache, year: int):
+        super().__init__(master)
+        self.cfg, self.cache = as_rules(cfg), cache
+        self.title("年度总览")
+        self.geometry("900x560")
+        self._q: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._gen = 0   # 每次刷新 +1，旧线程的结果直接丢弃
+        self._pumping = False
+
+        top = ttk.Frame(self, padding=(10, 8, 10, 0)); top.pack(fill=tk.X)
+        ttk.Label(top, text="年份：").pack(side=tk.LEFT)
+        self.year_var = tk.StringVar(value=str(year))
+        ycb = ttk.Combobox(top, textvariable=self.year_var, width=6, state="readonly",
+                           values=[str(y) for y in range(2000, year + 6)])
+        ycb.pack(side=tk.LEFT)
+        ycb.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        ttk.Button(top, text="刷新 (F5)", command=self.refresh).pack(side=tk.LEFT, padx=6)
+        self.status_var = tk.StringVar()
+        ttk.Label(top, textvariable=self.status_var, anchor="w").pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        wrap = ttk.Frame(self, padding=(10, 6, 10, 10)); wrap.pack(fill=tk.BOTH, expand=True)
+        ys = ttk.Scrollbar(wrap, orient="vertical"); ys.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(wrap, columns=MONTHS, show="tree headings", yscrollcommand=ys.set)
+        ys.config(command=self.tree.yview)
+        self.tree.heading("#0", text="文件类别")
+        self.tree.column("#0", width=220, minwidth=160, stretch=False, anchor="w")
+        for c in MONTHS:
+            self.tree.heading(c, text=f"{int(c)}月")
+            self.tree.column(c, width=52, minwidth=40, stretch=True, anchor="center")
+        self.tree.tag_configure("group", foreground="#666")
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.tree.bind("<Double-1>", self._open_cell)
+
+        self._build_rows()
+        self.bind("<F5>", lambda e: self.refresh())
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def _build_rows(self):
+        self.tree.delete(*self.tree.get_children())
+        order, groups = grouped_items(self.cfg.rules)
+        for g in order:
+            parent = self.tree.insert("", tk.END, iid=f"grp:{g}", text=f"—— {g} ——", tags=("group",), open=True)
+            for r in groups[g]:
+                if self.tree.exists(r.key): continue
+                self.tree.insert(parent, tk.END, iid=r.key, text=r.key, values=[""] * 12)
+
+    def set_config(self, cfg):
+        """配置热加载后换新规则重算（没变的目录走 ScanCache，基本不再列目录）。"""
+        self.cfg = as_rules(cfg)
+        self._build_rows(); self.refresh()
+
+    def year(self) -> int:
+        return int(self.year_var.get())
+
+    def refresh(self):
+        self._stop.set()
+        self._stop, self._gen = threading.Event(), self._gen + 1
+        y, gen, stop = self.year(), self._gen, self._stop
+        for r in self.cfg.rules:
+            if self.tree.exists(r.key): self.tree.item(r.key, values=["…"] * 12)
+        self._total = len(year_plan(self.cfg, y))
+        self._done, self._t0 = 0, time.perf_counter()
+        self._progress()
+
+        def work():
+            for cells in iter_year_matrix(self.cfg, y, self.cache, stop=stop):
+                self._q.put((gen, cells))
+            self._q.put((gen, None))
+        threading.Thread(target=work, daemon=True).start()
+        if not self._pumping:
+            self._pumping = True; self.after(30, self._pump)
+
+    def _pump(self):
+        if not self.winfo_exists(): return
+        finished = False
+        try:
+            while True:
+                gen, cells = self._q.get_nowait()
+                if gen != self._gen: continue
+                if cells is None:
+                    finished = True; continue
+                for key, m, cnt, ok in cells:
+                    if self.tree.exists(key):
+                        self.tree.set(key, MONTHS[m - 1], f"{'✅' if ok else '⬜'}{cnt}")
+                self._done += 1
+        except queue.Empty:
+            pass
+        self._progress(finished)
+        if finished: self._pumping = False
+        else: self.after(50, self._pump)
+
+    def _progress(self, finished: bool = False):
+        dt = time.perf_counter() - self._t0
+        self.status_var.set(f"{'完成' if finished else '扫描中'}：{self._done}/{self._total} 个目录，{dt:.1f}s")
+
+    def _open_cell(self, event):
+        key, col = self.tree.identify_row(event.y), self.tree.identify_column(event.x)
+        r = self.cfg.by_key.get(key)
+        if not r or col == "#0": return
+        d = r.target_dir(self.year(), int(col[1:]))
+        try: d.mkdir(parents=True, exist_ok=True); os.startfile(str(d))
+        except Exception as e: messagebox.showerror("打开失败", str(e), parent=self)
+
+    def close(self):
+        self._stop.set()
+        self.destroy()
+
+def open_overview(master, cfg, cache: ScanCache, year: int) -> YearOverview:
+    """已开着就置前，否则新开一个。"""
+    w = getattr(master, "_overview", None)
+    if w is not None and w.winfo_exists():
+        w.lift(); w.focus_force(); return w
+    master._overview = YearOverview(master, cfg, cache, year)
+    return master._overview